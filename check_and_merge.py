@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import glob
@@ -5,6 +6,10 @@ import requests
 import concurrent.futures
 from urllib.parse import urlparse
 
+from common.box_store import load_unique_configs
+from common.circuit_breaker import HostCircuitBreaker, host_key
+from common.dns_cache import DnsCache
+
 # --- 配置 ---
 BOX_DIR = "box"
 OUTPUT_FILE = "merged_tvbox_config.json"
@@ -19,6 +24,10 @@ EXCLUDED_EXTENSIONS = ('.js', '.json', '.txt', '.xml', '.yml', '.yaml', '.jsd')
 SESSION = requests.Session()
 # 模拟 TVBox 的 User-Agent
 HEADERS = {'User-Agent': 'okhttp/4.1.0'}
+# 主机熔断：同一主机连续连接失败 5 次后，其余 URL 直接判为不可用，60 秒后再试探
+BREAKER = HostCircuitBreaker(threshold=5, reset_timeout=60)
+# 主机名解析缓存，检查开始前批量预解析
+DNS = DnsCache()
 
 def is_valid_url(url: str) -> bool:
     """检查字符串是否是有效的 HTTP/HTTPS URL，并且是否可访问。"""
@@ -31,12 +40,27 @@ def is_valid_url(url: str) -> bool:
     except ValueError:
         return False
 
+    host = host_key(url)
+    if not DNS.is_resolvable(url):
+        return False
+    trial = BREAKER.allow(host)
+    if not trial:
+        return False
+
     try:
         # 使用 HEAD 请求更快，只获取头部信息
         response = SESSION.head(url, timeout=TIMEOUT, allow_redirects=True, headers=HEADERS)
-        return 200 <= response.status_code < 400
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        # 超时、拒绝连接等连接失败计入熔断统计
+        BREAKER.record_failure(host)
+        return False
     except requests.exceptions.RequestException:
         return False
+    else:
+        BREAKER.record_success(host)
+    finally:
+        BREAKER.release(host, trial)
+    return 200 <= response.status_code < 400
 
 def check_site(site: dict) -> dict or None:
     """
@@ -97,17 +121,7 @@ def check_site(site: dict) -> dict or None:
     print(f"❌ 站点 '{site_name}' 连通性测试失败，已移除。") 
     return None
 
-# --- 其他辅助函数 (process_file, merge_configs, main) 保持不变 ---
-def process_file(file_path: str) -> dict or None:
-    """读取并解析单个 JSON 文件。"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read().strip().lstrip('\ufeff')
-            return json.loads(content)
-    except Exception as e:
-        print(f"❌ 解析文件 {os.path.basename(file_path)} 失败: {e}")
-        return None
-
+# --- 其他辅助函数 (merge_configs, main) ---
 def merge_configs(configs: list[dict]) -> dict:
     """合并配置并并行检查站点 URL，只保留 sites 和 spider。"""
     merged_config = {
@@ -143,6 +157,11 @@ def merge_configs(configs: list[dict]) -> dict:
     
     checked_sites = []
     sites_to_check = list(unique_sites.values())
+
+    # 批量预解析 api/ext 中的主机名，解析失败的 URL 在 is_valid_url 中直接判为不可用
+    site_urls = [value.strip() for site in sites_to_check for value in (site.get('api'), site.get('ext')) if isinstance(value, str)]
+    host_count = asyncio.run(DNS.prefetch(site_urls))
+    print(f"--- 预解析 {host_count} 个主机 ---")
     
     with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         future_to_site = {executor.submit(check_site, site): site for site in sites_to_check}
@@ -180,8 +199,8 @@ def main():
         
     print(f"找到 {len(file_paths)} 个 JSON 配置文件进行处理...")
 
-    configs = [process_file(f) for f in file_paths]
-    configs = [c for c in configs if c is not None]
+    # 内容相同（键顺序、格式不同也算）的配置文件只处理一次
+    configs = [data for _, data in load_unique_configs(file_paths)]
     
     if not configs:
         print("未加载到有效的配置。退出。")
@@ -0,0 +1 @@
+# 各脚本共用的工具模块（探测、缓存、解析等）
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+BOX_DIR = "box"
+BOX_INDEX_FILE = "box_index.json"  # 名称索引放在 box/ 之外，合并脚本只读取 box/*.json
+HASH_PREFIX_LENGTH = 16  # 保存的文件名取规范化哈希的前 16 位
+
+
+def parse_config(text):
+    """解析 TVBox 配置文本（去掉 BOM），失败时返回 None"""
+    try:
+        return json.loads(text.strip().lstrip('\ufeff'))
+    except (json.JSONDecodeError, ValueError):
+        return None
+
+
+def canonical_json(data):
+    """规范化序列化：键排序、紧凑分隔符，格式和键顺序不同的相同配置得到相同的文本"""
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def canonical_hash(data):
+    return hashlib.sha256(canonical_json(data).encode('utf-8')).hexdigest()
+
+
+def load_index(index_file=BOX_INDEX_FILE):
+    """加载名称索引：{哈希前缀: {"names": [原始文件名], "saved_at": 首次保存时间}}"""
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"无法读取名称索引 '{index_file}': {e}")
+    return {}
+
+
+def save_index(index, index_file=BOX_INDEX_FILE):
+    with open(index_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def save_config(data, source_name, index, box_dir=BOX_DIR):
+    """
+    按内容寻址保存配置：文件名为规范化哈希的前 16 位，相同内容只保存一次，
+    原始文件名记录在名称索引中。返回 (保存的文件名, 是否新文件)。
+    """
+    key = canonical_hash(data)[:HASH_PREFIX_LENGTH]
+    file_name = f"{key}.json"
+    entry = index.setdefault(key, {"names": [], "saved_at": time.strftime("%Y%m%d%H%M%S")})
+    if source_name not in entry["names"]:
+        entry["names"].append(source_name)
+    path = os.path.join(box_dir, file_name)
+    if os.path.exists(path):
+        return file_name, False
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    return file_name, True
+
+
+def load_unique_configs(paths):
+    """
+    读取并解析配置文件，规范化内容相同的文件只保留第一个（按文件名排序），
+    返回 [(路径, 配置)]。旧的 “名称_时间戳.json” 文件中的重复内容在这里合并。
+    """
+    configs = []
+    seen = set()
+    duplicates = 0
+    for path in sorted(paths):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            logging.warning(f"无法读取文件 '{path}': {e}")
+            continue
+        data = parse_config(text)
+        if data is None:
+            logging.warning(f"文件 '{path}' 不是有效的 JSON，已跳过")
+            continue
+        content_hash = canonical_hash(data)
+        if content_hash in seen:
+            duplicates += 1
+            continue
+        seen.add(content_hash)
+        configs.append((path, data))
+    if duplicates:
+        logging.info(f"{len(paths)} 个配置文件中有 {duplicates} 个内容重复，已合并")
+    return configs
@@ -0,0 +1,67 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def host_key(url):
+    """熔断按 主机:端口 统计"""
+    try:
+        return urlparse(url).netloc.lower()
+    except ValueError:
+        return ''
+
+
+class HostCircuitBreaker:
+    """
+    按主机统计连续的连接失败（超时、拒绝连接等），达到 threshold 次后熔断该主机，
+    熔断期间该主机剩余的链接直接判为失败，不再等待超时。
+    熔断 reset_timeout 秒后进入半开状态：只放行一个试探请求，成功则恢复，失败则继续熔断。
+    allow 放行时返回一个令牌，请求结束时（不论是否记录了结果）把令牌交给 release，
+    只有持有试探令牌的请求才会释放试探名额，熔断前就已发出的请求不会让第二个试探请求通过。
+    只在线程内做少量字典操作，可在多线程和 asyncio 中共用一个实例。
+    """
+
+    def __init__(self, threshold=5, reset_timeout=60):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._opened_at = {}
+        self._probing = {}  # host -> 当前试探请求的令牌
+
+    def allow(self, host):
+        """
+        是否允许向该主机发起请求：不允许时返回 False，允许时返回令牌（布尔值为 True），
+        未熔断时令牌为 True，半开状态的试探请求得到一个单独的令牌对象
+        """
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return True
+            if host in self._probing or time.monotonic() - opened_at < self.reset_timeout:
+                return False
+            trial = object()  # 半开：放行一个试探请求
+            self._probing[host] = trial
+            return trial
+
+    def record_success(self, host):
+        """主机有响应（不论状态码），清除失败计数"""
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._probing.pop(host, None)
+
+    def record_failure(self, host):
+        """记录一次连接失败，连续失败达到阈值或半开试探失败时熔断"""
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if host in self._probing or failures >= self.threshold:
+                self._probing.pop(host, None)
+                self._opened_at[host] = time.monotonic()
+
+    def release(self, host, token):
+        """请求结束，token 为 allow 的返回值；只有试探请求释放试探名额，已记录成功或失败时不改变状态"""
+        with self._lock:
+            if token is not True and self._probing.get(host) is token:
+                del self._probing[host]
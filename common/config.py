@@ -0,0 +1,17 @@
+import logging
+
+import yaml
+
+CONFIG_PATH = "config/config.yaml"
+
+
+def load_config(config_path=CONFIG_PATH):
+    """加载并解析 YAML 配置文件，读取失败时返回空字典，调用方使用各自的默认值"""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as file:
+            return yaml.safe_load(file) or {}
+    except FileNotFoundError:
+        logging.warning(f"未找到配置文件 '{config_path}'，使用默认配置")
+    except yaml.YAMLError as e:
+        logging.error(f"配置文件 '{config_path}' 格式错误: {e}，使用默认配置")
+    return {}
@@ -0,0 +1,100 @@
+import asyncio
+import ipaddress
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+RESOLVE_SCHEMES = ('http', 'https')  # 只预解析这些协议的主机名，rtp/p3p 等地址不一定是 DNS 域名
+
+
+def url_host(url):
+    try:
+        return urlparse(url).hostname
+    except ValueError:
+        return None
+
+
+def is_ip_address(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+class DnsCache:
+    """
+    主机名解析缓存：解析成功的结果缓存 ttl 秒，解析失败（NXDOMAIN、SERVFAIL 等）缓存 negative_ttl 秒。
+    探测开始前用 prefetch 批量解析所有主机，再用 is_resolvable 过滤掉解析失败的链接。
+    系统解析器不返回记录的 TTL，缓存时间取固定值；可在多线程和 asyncio 中共用一个实例。
+    """
+
+    def __init__(self, ttl=300, negative_ttl=600):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # host -> (过期时间, [(family, ip)] 或 None)
+
+    def _cached(self, host):
+        with self._lock:
+            entry = self._entries.get(host)
+        if entry is None or entry[0] < time.monotonic():
+            return False, None
+        return True, entry[1]
+
+    def _store(self, host, infos):
+        addresses = None
+        if infos:
+            addresses = list(dict.fromkeys((family, sockaddr[0]) for family, _, _, _, sockaddr in infos))
+        ttl = self.ttl if addresses else self.negative_ttl
+        with self._lock:
+            self._entries[host] = (time.monotonic() + ttl, addresses)
+        return addresses
+
+    def resolve(self, host):
+        """同步解析，返回 [(family, ip)]，解析失败返回 None"""
+        hit, addresses = self._cached(host)
+        if hit:
+            return addresses
+        try:
+            infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except (socket.gaierror, UnicodeError):
+            infos = None
+        return self._store(host, infos)
+
+    async def resolve_async(self, host):
+        """在事件循环的线程池中解析，返回值同 resolve"""
+        hit, addresses = self._cached(host)
+        if hit:
+            return addresses
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except (socket.gaierror, UnicodeError):
+            infos = None
+        return self._store(host, infos)
+
+    async def prefetch(self, urls, concurrency=64):
+        """批量解析链接中的主机名，每个主机只解析一次，IP 地址和非 http(s) 链接跳过"""
+        hosts = set()
+        for url in urls:
+            if url.lower().startswith(RESOLVE_SCHEMES):
+                host = url_host(url)
+                if host and not is_ip_address(host):
+                    hosts.add(host)
+        slots = asyncio.Semaphore(concurrency)
+
+        async def resolve(host):
+            async with slots:
+                await self.resolve_async(host)
+
+        await asyncio.gather(*[resolve(host) for host in hosts])
+        return len(hosts)
+
+    def is_resolvable(self, url):
+        """只有已解析且失败的主机返回 False，未解析过的主机不做判断"""
+        host = url_host(url)
+        if not host:
+            return True
+        hit, addresses = self._cached(host)
+        return not hit or addresses is not None
@@ -0,0 +1,169 @@
+import asyncio
+import re
+import time
+from typing import List, NamedTuple, Optional
+from urllib.parse import urljoin
+
+import aiohttp
+
+MAX_PLAYLIST_BYTES = 512 * 1024  # m3u8 文本最多读取的字节数
+DEFAULT_SEGMENTS = 3  # 默认连续下载的视频片段数
+DEFAULT_BUDGET = 8  # 默认的探测总时长（秒）
+
+BANDWIDTH_RE = re.compile(r'(?<![-A-Z])BANDWIDTH=(\d+)')
+
+
+class Variant(NamedTuple):
+    bandwidth: Optional[int]
+    url: str
+
+
+class Segment(NamedTuple):
+    duration: Optional[float]
+    url: str
+
+
+class Playlist(NamedTuple):
+    variants: List[Variant]  # 主播放列表中的各码率子列表
+    segments: List[Segment]  # 媒体播放列表中的视频片段
+
+
+class HlsScore(NamedTuple):
+    sustain: float  # 可持续播放比例：>= 1 表示下载速度跟得上播放速度
+    throughput: float  # 视频片段的下载速度（字节/秒）
+    latency_ms: float  # 获取 m3u8 的耗时（毫秒）
+    segments: int  # 完整下载的片段数
+
+
+def is_playlist(text):
+    return text.lstrip('\ufeff \r\n\t').startswith('#EXTM3U')
+
+
+def parse_playlist(text, base_url):
+    """
+    解析 m3u8 文本，相对地址按 base_url 补全。
+    主播放列表返回各码率子列表（#EXT-X-STREAM-INF 的 BANDWIDTH），媒体播放列表返回视频片段（#EXTINF 的时长）。
+    """
+    variants = []
+    segments = []
+    stream_bandwidth = None
+    in_stream_inf = False
+    duration = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#EXT-X-STREAM-INF'):
+            match = BANDWIDTH_RE.search(line)
+            stream_bandwidth = int(match.group(1)) if match else None
+            in_stream_inf = True
+        elif line.startswith('#EXTINF'):
+            try:
+                duration = float(line.split(':', 1)[1].split(',', 1)[0])
+            except (IndexError, ValueError):
+                duration = None
+        elif not line.startswith('#'):
+            url = urljoin(base_url, line)
+            if in_stream_inf:
+                variants.append(Variant(stream_bandwidth, url))
+                in_stream_inf = False
+            else:
+                segments.append(Segment(duration, url))
+            duration = None
+    return Playlist(variants, segments)
+
+
+def sustain_ratio(bytes_read, media_seconds, elapsed, bandwidth=None):
+    """
+    计算可持续播放比例。已知码率时用实际下载速度与声明码率之比，
+    否则用完整下载的片段时长与实际耗时之比（每秒钟能下载几秒的视频）。
+    """
+    elapsed = max(elapsed, 0.001)
+    if bandwidth:
+        return bytes_read * 8 / elapsed / bandwidth
+    return media_seconds / elapsed
+
+
+def _remaining(deadline):
+    """到 deadline 为止的剩余时间，作为单个请求（含等待响应头和读取响应体）的总超时"""
+    return aiohttp.ClientTimeout(total=max(deadline - time.monotonic(), 0.001))
+
+
+async def _read_text(session, url, deadline):
+    async with session.get(url, allow_redirects=True, timeout=_remaining(deadline)) as response:
+        if response.status != 200:
+            return None, None
+        body = bytearray()
+        while len(body) < MAX_PLAYLIST_BYTES:
+            chunk = await response.content.readany()
+            if not chunk:
+                break
+            body.extend(chunk)
+        return body.decode('utf-8', errors='replace'), str(response.url)
+
+
+async def probe_stream(session, url, segments=DEFAULT_SEGMENTS, budget=DEFAULT_BUDGET, max_bytes=None):
+    """
+    多片段持续码率探测：读取 m3u8（主播放列表跟随第一个子列表一次），在 budget 秒内连续下载
+    前 segments 个视频片段，返回 HlsScore；不是 m3u8 或没有可下载的片段时返回 None。
+    超出时间预算或读满 max_bytes 字节时按已读取的数据计算，视频片段只在内存中计数。
+    只有读取链接本身时的连接失败和超时（aiohttp.ClientConnectionError、asyncio.TimeoutError）直接抛出，
+    由调用方计入该主机的熔断统计；子列表和视频片段常在其他 CDN 主机上，它们的失败只使探测返回 None 或提前结束。
+    """
+    start_time = time.monotonic()
+    deadline = start_time + budget
+    try:
+        text, final_url = await _read_text(session, url, deadline)
+    except aiohttp.ClientConnectionError:
+        raise
+    except (aiohttp.ClientError, ValueError):
+        return None
+    latency_ms = (time.monotonic() - start_time) * 1000
+    if text is None or not is_playlist(text):
+        return None
+    playlist = parse_playlist(text, final_url)
+    bandwidth = None
+    if playlist.variants:
+        variant = playlist.variants[0]
+        bandwidth = variant.bandwidth
+        try:
+            text, final_url = await _read_text(session, variant.url, deadline)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return None
+        if text is None or not is_playlist(text):
+            return None
+        playlist = parse_playlist(text, final_url)
+    if not playlist.segments:
+        return None
+
+    bytes_read = 0
+    media_seconds = 0.0
+    fetched = 0
+    segment_start = time.monotonic()
+    try:
+        for segment in playlist.segments[:segments]:
+            async with session.get(segment.url, allow_redirects=True, timeout=_remaining(deadline)) as response:
+                if response.status != 200:
+                    break
+                while True:
+                    chunk = await response.content.readany()
+                    if not chunk:
+                        break
+                    bytes_read += len(chunk)
+                    if max_bytes and bytes_read >= max_bytes:
+                        break
+            if max_bytes and bytes_read >= max_bytes:
+                break
+            fetched += 1
+            media_seconds += segment.duration or 0
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        pass  # 时间预算用完或连接中断，按已下载的数据计算
+    if not bytes_read:
+        return None
+    elapsed = time.monotonic() - segment_start
+    return HlsScore(
+        sustain=sustain_ratio(bytes_read, media_seconds, elapsed, bandwidth),
+        throughput=bytes_read / max(elapsed, 0.001),
+        latency_ms=latency_ms,
+        segments=fetched,
+    )
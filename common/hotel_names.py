@@ -0,0 +1,51 @@
+from common.normalizer import build_normalizer
+
+# 酒店源频道名称标准化规则，按轮次依次执行，后一轮可以作用于前一轮的替换结果。
+# 第一轮：去掉分隔符，并把 中央电视台/中央/央视 统一为 CCTV，之后的 “CCTV5体育” 等规则才能匹配
+HOTEL_PRE_REPLACEMENTS = {
+    "-": "", " ": "", "(": "", ")": "", "＋": "+", "PLUS": "+",
+    "cctv": "CCTV", "中央电视台": "CCTV", "中央": "CCTV", "央视": "CCTV",
+}
+# 与 config.yaml 的替换规则合并且优先
+HOTEL_EXTRA_REPLACEMENTS = {
+    "超高清": "",
+    "超高": "",
+}
+# 最后一轮：去掉 CCTV 频道号后面的频道说明
+HOTEL_POST_REPLACEMENTS = {
+    "CCTV1综合": "CCTV1",
+    "CCTV2财经": "CCTV2",
+    "CCTV3综艺": "CCTV3",
+    "CCTV4国际": "CCTV4",
+    "CCTV4中文国际": "CCTV4",
+    "CCTV4欧洲": "CCTV4",
+    "CCTV5体育": "CCTV5",
+    "CCTV6电影": "CCTV6",
+    "CCTV7军事": "CCTV7",
+    "CCTV7军农": "CCTV7",
+    "CCTV7农业": "CCTV7",
+    "CCTV7国防军事": "CCTV7",
+    "CCTV8电视剧": "CCTV8",
+    "CCTV9记录": "CCTV9",
+    "CCTV9纪录": "CCTV9",
+    "CCTV10科教": "CCTV10",
+    "CCTV11戏曲": "CCTV11",
+    "CCTV12社会与法": "CCTV12",
+    "CCTV13新闻": "CCTV13",
+    "CCTV新闻": "CCTV13",
+    "CCTV14少儿": "CCTV14",
+    "CCTV15音乐": "CCTV15",
+    "CCTV16奥林匹克": "CCTV16",
+    "CCTV17农业农村": "CCTV17",
+    "CCTV17农业": "CCTV17",
+    "CCTV5+体育赛视": "CCTV5+",
+    "CCTV5+体育赛事": "CCTV5+",
+    "CCTV5+体育": "CCTV5+",
+    "苏州生活咨讯": "苏州生活",
+}
+HOTEL_PATTERNS = [(r"CCTV(\d+)台", r"CCTV\1")]
+
+
+def build_hotel_normalizer(config, **kwargs):
+    return build_normalizer(config, HOTEL_PRE_REPLACEMENTS, HOTEL_EXTRA_REPLACEMENTS, HOTEL_PATTERNS,
+                            post_replacements=HOTEL_POST_REPLACEMENTS, **kwargs)
@@ -0,0 +1,162 @@
+import json
+import logging
+import re
+
+SYNONYMS_FILE = "config/channel_synonyms.json"
+
+
+def load_synonyms(file_name=SYNONYMS_FILE):
+    """读取同义词文件，返回 {小写别名: 标准名} 的反向查找字典"""
+    synonyms = {}
+    try:
+        with open(file_name, 'r', encoding='utf-8') as f:
+            for key, values in json.load(f).items():
+                for value in values:
+                    synonyms[value.lower()] = key
+    except FileNotFoundError:
+        logging.warning(f"同义词文件 '{file_name}' 未找到，将不使用频道名称标准化功能。")
+    except json.JSONDecodeError:
+        logging.error(f"同义词文件 '{file_name}' 格式错误，请检查 JSON 语法。")
+    return synonyms
+
+
+def _compile_alternation(words):
+    """把一组关键词编译成一个不区分大小写的正则，长词优先，保证最长匹配"""
+    words = sorted({word for word in words if word}, key=len, reverse=True)
+    if not words:
+        return None
+    return re.compile('|'.join(re.escape(word) for word in words), re.IGNORECASE)
+
+
+class _ReplacementPass:
+    """
+    一轮替换：所有规则编译进一个正则，单次扫描完成，替换结果不再参与本轮匹配。
+    对“翡翠 -> TVB翡翠”这类扩写规则，若匹配处本身已是完整的替换结果则保持不变。
+    """
+
+    def __init__(self, replacements):
+        self.table = {key.lower(): value for key, value in replacements.items()}
+        # 扩写规则：替换值中包含关键词时，记录关键词在替换值中的位置
+        self.expansions = {}
+        for key, value in self.table.items():
+            offset = value.lower().find(key)
+            if offset != -1 and value.lower() != key:
+                self.expansions[key] = offset
+        self.pattern = _compile_alternation(self.table)
+
+    def _replace(self, match):
+        key = match.group(0).lower()
+        value = self.table.get(key)
+        if value is None:
+            return match.group(0)
+        offset = self.expansions.get(key)
+        if offset is not None:
+            start = match.start() - offset
+            if start >= 0 and match.string[start:start + len(value)].lower() == value.lower():
+                return match.group(0)
+        return value
+
+    def apply(self, name):
+        if self.pattern is None:
+            return name
+        return self.pattern.sub(self._replace, name)
+
+
+def _is_ascii_alnum(char):
+    return char.isascii() and char.isalnum()
+
+
+class _ConfigRules:
+    """
+    config.yaml 的替换规则。
+    替换值为空的规则（去掉 HD、高清、4K 等标识）和单个符号的规则（如 "-"）在名称中按子串替换，
+    以英文字母或数字开头/结尾的标识只在前后不是英文字母时匹配，不会把 MSDN、SDTV、CCTV4K 拆开；
+    其余规则（东森 -> 东森新闻、中央 -> CCTV 等）只做整名映射，不改写包含该词的其他名称。
+    """
+
+    def __init__(self, replacements):
+        self.tags = {}
+        self.mapping = {}
+        for key, value in replacements.items():
+            if not key:
+                continue
+            if value == '' or (len(key) == 1 and not key.isalnum()):
+                self.tags[key.lower()] = value
+            else:
+                self.mapping[key.lower()] = value
+        alternatives = []
+        for key in sorted(self.tags, key=len, reverse=True):
+            pattern = re.escape(key)
+            if _is_ascii_alnum(key[0]):
+                pattern = '(?<![A-Za-z])' + pattern
+            if _is_ascii_alnum(key[-1]):
+                pattern += '(?![A-Za-z])'
+            alternatives.append(pattern)
+        self.pattern = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def apply(self, name):
+        mapped = self.mapping.get(name.lower())
+        if mapped is not None:
+            return mapped
+        if self.pattern is not None:
+            name = self.pattern.sub(lambda match: self.tags[match.group(0).lower()], name).strip()
+        return self.mapping.get(name.lower(), name)
+
+
+class ChannelNameNormalizer:
+    """
+    频道名称标准化与过滤。
+    过滤词和替换规则在构造时一次性编译成多模式正则，结果按原始名称缓存，
+    同一个名称重复出现时不再重复计算。
+    """
+
+    def __init__(self, filter_words=(), replacement_passes=(), synonyms=None, patterns=()):
+        self.synonyms = synonyms or {}
+        self._filter = _compile_alternation(filter_words)
+        # 每一轮是 _ReplacementPass、_ConfigRules 或 {关键词: 替换值}（按 _ReplacementPass 处理）
+        self._passes = [replacements if hasattr(replacements, 'apply') else _ReplacementPass(replacements)
+                        for replacements in replacement_passes]
+        self._patterns = [(re.compile(pattern), repl) for pattern, repl in patterns]
+        self._normalized = {}
+        self._filtered = {}
+
+    def standardize(self, name):
+        """按同义词表做整名映射"""
+        return self.synonyms.get(name.lower(), name)
+
+    def is_filtered(self, name):
+        """名称（同义词映射后）包含任一过滤词时返回 True"""
+        filtered = self._filtered.get(name)
+        if filtered is None:
+            filtered = self._filter is not None and self._filter.search(self.standardize(name)) is not None
+            self._filtered[name] = filtered
+        return filtered
+
+    def normalize(self, name):
+        """同义词映射后依次执行各轮替换和正则规则，返回去掉首尾空白的标准名称"""
+        normalized = self._normalized.get(name)
+        if normalized is None:
+            normalized = self.standardize(name)
+            for replacement_pass in self._passes:
+                normalized = replacement_pass.apply(normalized)
+            for pattern, repl in self._patterns:
+                normalized = pattern.sub(repl, normalized)
+            normalized = normalized.strip()
+            self._normalized[name] = normalized
+        return normalized
+
+
+def build_normalizer(config, pre_replacements=None, extra_replacements=None, patterns=(),
+                     extra_filter_words=(), synonyms_file=SYNONYMS_FILE, post_replacements=None):
+    """
+    按 config.yaml 的 name_filter_words 和 channel_name_replacements 构建标准化器。
+    pre_replacements 在配置规则之前单独执行一轮子串替换（如先去掉分隔符），
+    extra_replacements 与配置规则合并且优先（规则的匹配方式见 _ConfigRules），
+    post_replacements 在配置规则之后单独执行一轮子串替换，可以作用于配置规则的替换结果，
+    patterns 为最后执行的 (正则, 替换) 列表。
+    """
+    filter_words = list(config.get('name_filter_words') or []) + list(extra_filter_words)
+    replacements = {str(key): str(value) for key, value in (config.get('channel_name_replacements') or {}).items()}
+    replacements.update(extra_replacements or {})
+    passes = [pass_ for pass_ in (pre_replacements, _ConfigRules(replacements), post_replacements) if pass_]
+    return ChannelNameNormalizer(filter_words, passes, load_synonyms(synonyms_file), patterns)
@@ -0,0 +1,82 @@
+import codecs
+import logging
+import re
+
+CHUNK_SIZE = 64 * 1024
+MAX_SOURCE_BYTES = 20 * 1024 * 1024  # 单个源最多读取的字节数
+
+GROUP_TITLE_RE = re.compile(r'group-title="([^"]*)"')
+URL_LINE_RE = re.compile(r'^[A-Za-z][A-Za-z0-9+.\-]*://')
+
+
+def read_chunks(response, chunk_size=CHUNK_SIZE):
+    """按块读取类文件对象（如 urllib 的响应）"""
+    return iter(lambda: response.read(chunk_size), b'')
+
+
+def iter_lines(chunks, max_bytes=MAX_SOURCE_BYTES, hasher=None, source=''):
+    """
+    将字节块增量解码为文本行，内存中只保留当前不完整的一行。
+    读取量达到 max_bytes 后停止读取并丢弃最后不完整的行；
+    传入 hasher 时，每个读到的字节块都会喂给它，用于计算内容哈希。
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ''
+    total = 0
+    for chunk in chunks:
+        if hasher is not None:
+            hasher.update(chunk)
+        total += len(chunk)
+        lines = (pending + decoder.decode(chunk)).split('\n')
+        pending = lines.pop()
+        yield from lines
+        if total >= max_bytes:
+            logging.warning(f"源 {source} 超过 {max_bytes} 字节上限，已截断")
+            return
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def iter_playlist(lines):
+    """
+    增量解析 M3U 或 TXT（频道名,链接）格式的播放列表，逐条产出 (频道名, 分组, 链接)。
+    M3U 的分组取 group-title，TXT 的分组取最近的 “分组,#genre#” 行，没有时为 None。
+    """
+    extinf_name = None
+    extinf_group = None
+    genre = None
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#EXTM3U'):
+            continue
+
+        if line.startswith('#EXTINF'):
+            # 频道名称在最后一个逗号之后
+            extinf_name = line.rsplit(',', 1)[-1].strip() if ',' in line else None
+            group_match = GROUP_TITLE_RE.search(line)
+            extinf_group = group_match.group(1).strip() if group_match else None
+            continue
+        if line.startswith('#'):
+            continue
+
+        if URL_LINE_RE.match(line):
+            # M3U 链接行，归属于上一条 #EXTINF
+            if extinf_name:
+                yield extinf_name, extinf_group, line
+            extinf_name = None
+            continue
+
+        if '#genre#' in line:
+            genre = line.split(',', 1)[0].strip() or None
+            continue
+
+        # TXT 格式：频道名称中可能含逗号，以链接协议前的最后一个逗号分隔
+        scheme_index = line.find('://')
+        separator = line.rfind(',', 0, scheme_index)
+        if scheme_index == -1 or separator == -1:
+            continue
+        name = line[:separator].strip()
+        url = line[separator + 1:].strip()
+        if name and url:
+            yield name, genre, url
@@ -0,0 +1,141 @@
+import asyncio
+import socket
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+from aiohttp.abc import AbstractResolver
+
+from common import hls
+from common.circuit_breaker import host_key
+
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+
+class _ConnectionFailed:
+    """连接失败（超时、拒绝连接等）时的探测结果：按失败处理，但通常是暂时的，缓存时间应更短"""
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return 'CONNECTION_FAILED'
+
+
+CONNECTION_FAILED = _ConnectionFailed()
+
+
+class CachedResolver(AbstractResolver):
+    """aiohttp 解析器：通过 DnsCache 解析，同一主机在整个进程内只查询一次，解析失败的结果同样缓存"""
+
+    def __init__(self, dns):
+        self.dns = dns
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        addresses = await self.dns.resolve_async(host.lower())
+        results = [
+            {'hostname': host, 'host': ip, 'port': port, 'family': addr_family, 'proto': 0, 'flags': socket.AI_NUMERICHOST}
+            for addr_family, ip in addresses or []
+            if family in (socket.AF_UNSPEC, addr_family)
+        ]
+        if not results:
+            raise OSError(f"无法解析主机 {host}")
+        return results
+
+    async def close(self):
+        pass
+
+
+class ProbeEngine:
+    """
+    异步链接探测引擎。
+    所有请求共用一个 aiohttp 连接池，全局并发和单个主机的并发都有上限，
+    每个链接只发起一次请求。需要在 async with 中使用。
+    传入 breaker（HostCircuitBreaker）时，被熔断主机的链接不发请求，直接返回 (None, 失败结果)。
+    连接失败和超时的结果为 CONNECTION_FAILED（布尔值为 False），调用方可据此区分暂时的失败。
+    传入 dns（DnsCache）时，连接池通过该缓存解析主机名。
+    """
+
+    def __init__(self, concurrency=200, per_host=8, timeout=6, headers=None, breaker=None, dns=None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.headers = headers or DEFAULT_HEADERS
+        self.breaker = breaker
+        self.dns = dns
+        self.session = None
+        self._global_slots = None
+        self._host_slots = {}
+
+    async def __aenter__(self):
+        self._global_slots = asyncio.Semaphore(self.concurrency)
+        resolver = CachedResolver(self.dns) if self.dns is not None else None
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300, resolver=resolver)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.headers,
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    def _host_slot(self, host):
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host)
+        return slot
+
+    async def _run(self, url, probe, failed=False, track=True):
+        # 先占主机名额再占全局名额，避免同一主机的排队请求占满全局并发
+        breaker = self.breaker if track else None
+        host = host_key(url)
+        async with self._host_slot(urlparse(url).hostname or ''):
+            # 排队期间主机可能已被熔断，此时不再发请求
+            trial = breaker.allow(host) if breaker is not None else True
+            if not trial:
+                return None, failed
+            try:
+                async with self._global_slots:
+                    start_time = time.time()
+                    try:
+                        result = await probe()
+                    except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                        # 超时、拒绝连接等连接失败计入熔断统计
+                        if breaker is not None:
+                            breaker.record_failure(host)
+                        result = CONNECTION_FAILED
+                    else:
+                        if breaker is not None:
+                            breaker.record_success(host)
+                    elapsed_time = (time.time() - start_time) * 1000  # 转换为毫秒
+                    return elapsed_time, result
+            finally:
+                # 其他异常或任务取消时释放半开试探名额，避免主机在本次运行中一直被熔断
+                if breaker is not None:
+                    breaker.release(host, trial)
+
+    async def probe_http(self, url):
+        """发起一次 GET 请求，只看状态码，不读取响应体"""
+        async def probe():
+            try:
+                async with self.session.get(url, allow_redirects=True) as response:
+                    return response.status == 200
+            except aiohttp.ClientConnectionError:
+                raise
+            except (aiohttp.ClientError, ValueError):
+                return False
+        return await self._run(url, probe)
+
+    async def probe_blocking(self, url, check, *args):
+        """在线程中运行同步检测函数（rtmp/rtp/p3p 等非 HTTP 协议），同样受并发上限约束，不参与熔断"""
+        async def probe():
+            return await asyncio.to_thread(check, url, *args)
+        return await self._run(url, probe, track=False)
+
+    async def probe_hls(self, url, segments=hls.DEFAULT_SEGMENTS, budget=hls.DEFAULT_BUDGET):
+        """多片段持续码率探测，返回 (耗时毫秒, HlsScore)，不是可播放的 m3u8 时 HlsScore 为 None"""
+        async def probe():
+            return await hls.probe_stream(self.session, url, segments, budget)
+        return await self._run(url, probe, failed=None)
@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+
+class SourceEntry(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+    records: list
+
+
+class SourceCache:
+    """
+    播放列表源缓存（SQLite）：记录每个源的 ETag、Last-Modified、内容哈希和已解析的频道记录。
+    源未变化（304 或内容哈希相同）时直接复用解析结果，跳过下载与解析。
+    kind 用于区分不同脚本各自的解析结果，可在多线程中共用一个实例。
+    """
+
+    def __init__(self, path, ttl=None):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "kind TEXT NOT NULL, url TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "content_hash TEXT NOT NULL, records TEXT NOT NULL, fetched_at REAL NOT NULL, "
+            "PRIMARY KEY (kind, url))"
+        )
+        if ttl:
+            self._conn.execute("DELETE FROM sources WHERE fetched_at < ?", (time.time() - ttl,))
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config, file_name='sources.sqlite'):
+        """按 config.yaml 的 url_state 配置创建缓存，未启用缓存时返回 None"""
+        url_state = config.get('url_state', {})
+        if not url_state.get('cache_enabled', True):
+            return None
+        path = os.path.join(url_state.get('cache_dir', 'cache'), file_name)
+        try:
+            return cls(path, url_state.get('cache_ttl', 604800))
+        except sqlite3.Error as e:
+            logging.warning(f"无法打开源缓存 '{path}': {e}，本次不使用缓存")
+            return None
+
+    def lookup(self, kind, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, records FROM sources WHERE kind = ? AND url = ?",
+                (kind, url)
+            ).fetchone()
+        if row is None:
+            return None
+        return SourceEntry(row[0], row[1], row[2], json.loads(row[3]))
+
+    @staticmethod
+    def conditional_headers(entry):
+        """根据缓存条目生成条件请求头"""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, kind, url, etag, last_modified, content_hash, records):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources "
+                "(kind, url, etag, last_modified, content_hash, records, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, url, etag, last_modified, content_hash,
+                 json.dumps(records, ensure_ascii=False, separators=(',', ':')), time.time())
+            )
+            self._conn.commit()
+
+    def touch(self, kind, url, etag=None, last_modified=None):
+        """源未变化时刷新抓取时间，服务器返回了新的校验头则一并更新"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE sources SET fetched_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified) WHERE kind = ? AND url = ?",
+                (time.time(), etag, last_modified, kind, url)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,87 @@
+import os
+
+_TERMINAL = ''
+
+
+class TemplateIndex:
+    """
+    频道模板索引：预先把模板中的频道名建成 {名称: [分类...]} 字典和前缀树，每个频道一次查询即可分类。
+    同一频道出现在多个模板中时归入所有这些分类，与逐个模板匹配的旧逻辑一致。
+    精确匹配优先；否则按最长前缀做模糊匹配，如模板中的 CCTV1 可匹配 CCTV1综合、CCTV1HD，
+    但不会匹配 CCTV13 或 CCTV1+ 这类数字/加号延续的名称。匹配不区分大小写。
+    """
+
+    def __init__(self):
+        self.categories = []
+        # config/template.txt 中各分类的出现顺序，用于合并输出时排序
+        self.block_categories = []
+        self._exact = {}
+        self._trie = {}
+        self._cache = {}
+
+    def add(self, category, name):
+        name = name.strip()
+        if not name:
+            return
+        if category not in self.categories:
+            self.categories.append(category)
+        key = name.casefold()
+        matches = self._exact.get(key)
+        if matches is None:
+            matches = self._exact[key] = []
+            node = self._trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[_TERMINAL] = matches
+        if all(existing != category for existing, _ in matches):
+            matches.append((category, name))
+
+    def classify(self, channel_name):
+        """返回 [(分类, 模板频道名), ...]（按模板加载顺序），无法归类时返回 None"""
+        if channel_name in self._cache:
+            return self._cache[channel_name]
+        key = channel_name.strip().casefold()
+        match = self._exact.get(key)
+        if match is None:
+            node = self._trie
+            for index, char in enumerate(key):
+                node = node.get(char)
+                if node is None:
+                    break
+                if _TERMINAL in node and index + 1 < len(key) and self._is_boundary(key, index + 1):
+                    match = node[_TERMINAL]
+        self._cache[channel_name] = match
+        return match
+
+    @staticmethod
+    def _is_boundary(key, end):
+        # 模板名以数字结尾时，后面紧跟数字或加号说明是另一个频道（CCTV1 与 CCTV13、CCTV5 与 CCTV5+）
+        if key[end - 1].isdigit() and (key[end].isdigit() or key[end] == '+'):
+            return False
+        return True
+
+    def add_directory(self, directory):
+        """每个 .txt 文件是一个分类，文件名即分类名，每行一个频道名"""
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.endswith('.txt'):
+                category = os.path.splitext(file_name)[0]
+                with open(os.path.join(directory, file_name), 'r', encoding='utf-8') as f:
+                    for line in f:
+                        self.add(category, line)
+
+    def add_block_file(self, file_path):
+        """config/template.txt 格式：空行分隔的块，块的第一行为分类名，其余为频道名，# 开头为注释"""
+        category = None
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('#'):
+                    continue
+                if not line:
+                    category = None
+                elif category is None:
+                    category = line
+                    if category not in self.block_categories:
+                        self.block_categories.append(category)
+                else:
+                    self.add(category, line)
@@ -0,0 +1,121 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonical_url(url):
+    """规范化 URL 作为缓存键：去掉首尾空白和片段，协议与主机名小写，省略默认端口"""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        host = parts.hostname or ''
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if ':' in host:
+        host = f"[{host}]"
+    netloc = host
+    if port and DEFAULT_PORTS.get(scheme) != port:
+        netloc = f"{netloc}:{port}"
+    if parts.username:
+        userinfo = parts.username if parts.password is None else f"{parts.username}:{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+class VerdictCache:
+    """
+    持久化的链接探测结论缓存（SQLite），以 (规范化 URL, 探测方式) 为键，记录是否可用、延迟和检测时间。
+    不同脚本的探测方式不同（tv.py 用 GET 看状态码，check_and_clean.py 用 HEAD 看 Content-Type），
+    各自的结论分开保存；share_from 中列出的其他探测方式只复用其“可用”结论。
+    连接失败和超时多是暂时的，这类失败结论只保留 failure_ttl 秒。
+    在有效期内的结论可直接复用，不再重复探测。可在多线程中共用一个实例。
+    """
+
+    COMMIT_EVERY = 500
+
+    def __init__(self, path, ttl, expiration=None, method='get', share_from=(), failure_ttl=None):
+        self.path = path
+        self.ttl = ttl
+        self.method = method
+        self.share_from = tuple(share_from)
+        self.failure_ttl = ttl if failure_ttl is None else min(failure_ttl, ttl)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # 旧版本的表不区分探测方式，直接丢弃
+        self._conn.execute("DROP TABLE IF EXISTS verdicts")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS probe_verdicts ("
+            "url TEXT NOT NULL, method TEXT NOT NULL, ok INTEGER NOT NULL, latency_ms REAL, "
+            "checked_at REAL NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (url, method))"
+        )
+        if expiration:
+            self._conn.execute("DELETE FROM probe_verdicts WHERE checked_at < ?", (time.time() - expiration,))
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config, file_name='probe_verdicts.sqlite', method='get', share_from=()):
+        """按 config.yaml 的 url_state 配置创建缓存，未启用缓存时返回 None"""
+        url_state = config.get('url_state', {})
+        if not url_state.get('cache_enabled', True):
+            return None
+        path = os.path.join(url_state.get('cache_dir', 'cache'), file_name)
+        ttl = url_state.get('verdict_ttl', 86400)
+        failure_ttl = url_state.get('verdict_failure_ttl', 1800)
+        expiration = url_state.get('expiration_days', 7) * 86400
+        try:
+            return cls(path, ttl, expiration, method, share_from, failure_ttl)
+        except sqlite3.Error as e:
+            logging.warning(f"无法打开探测结论缓存 '{path}': {e}，本次不使用缓存")
+            return None
+
+    def get(self, url):
+        """返回仍在有效期内的 (ok, latency_ms)，没有或已过期时返回 None"""
+        methods = (self.method,) + self.share_from
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT method, ok, latency_ms FROM probe_verdicts WHERE url = ? AND expires_at > ? AND checked_at > ? "
+                f"AND method IN ({','.join('?' * len(methods))})",
+                (canonical_url(url), time.time(), time.time() - self.ttl) + methods
+            ).fetchall()
+        for method, ok, latency_ms in rows:
+            if method == self.method:
+                return bool(ok), latency_ms
+        for method, ok, latency_ms in rows:
+            if ok:
+                return True, latency_ms
+        return None
+
+    def put(self, url, ok, latency_ms=None, transient=False):
+        """记录探测结论；transient 表示连接失败或超时，这类失败只缓存 failure_ttl 秒"""
+        now = time.time()
+        ttl = self.failure_ttl if transient and not ok else self.ttl
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO probe_verdicts (url, method, ok, latency_ms, checked_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (canonical_url(url), self.method, int(bool(ok)), latency_ms, now, now + ttl)
+            )
+            self._pending += 1
+            if self._pending >= self.COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
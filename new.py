@@ -1,12 +1,44 @@
 import time
-import concurrent.futures
-import requests
+import json
+import asyncio
+import aiohttp
+import contextlib
 import re
 import os
-import threading
-from queue import Queue
-import eventlet
-eventlet.monkey_patch()
+from collections import defaultdict
+from urllib.parse import urlparse
+from common import hls
+from common.config import load_config
+from common.dns_cache import DnsCache
+from common.hotel_names import build_hotel_normalizer
+from common.probe import CachedResolver
+CONFIG = load_config()
+# 网段扫描配置：同时进行的 TCP 连接数、每秒发起的连接数上限、连接超时（秒）
+SCAN_CONCURRENCY = 1000
+SCAN_CONNECT_RATE = 2000
+SCAN_CONNECT_TIMEOUT = 0.5
+# JSON 接口检测配置：并发数、同一主机的连接数、读取超时和单个接口的总耗时上限（秒）
+JSON_PATH = "/iptv/live/1000.json?key=txiptv"
+JSON_CHECK_CONCURRENCY = 100
+JSON_CHECK_PER_HOST = 2
+JSON_READ_TIMEOUT = 0.5
+JSON_TOTAL_TIMEOUT = 3
+# 主机命中表：记录每个网段可用的主机，下次优先探测；整段扫描的间隔和主机记录的保留时间（秒）
+HOST_TABLE_FILE = os.path.join(CONFIG.get('url_state', {}).get('cache_dir', 'cache'), 'hotel_hosts.json')
+FULL_SCAN_INTERVAL = 7 * 86400
+HOST_RETENTION = 30 * 86400
+# 测速配置：同时测速的频道数、同一网关同时测速的频道数、每个频道的测速总预算（秒）
+SPEED_TEST_CONCURRENCY = 500
+SPEED_TEST_PER_GATEWAY = 4
+SPEED_TEST_BUDGET = 5
+# 每个频道连续下载的视频片段数、最多读取的字节数、读取 m3u8 和视频片段的最长时间（秒）
+SPEED_TEST_SEGMENTS = 3
+SPEED_TEST_MAX_BYTES = 8 * 1024 * 1024
+SPEED_TEST_WINDOW = 4
+# 可持续播放比例达到该值即视为播放流畅，流畅的链接之间再按下载速度排序
+SUSTAIN_TARGET = 1.0
+# 频道名称标准化：规则见 common/hotel_names.py
+NAME_NORMALIZER = build_hotel_normalizer(CONFIG)
 urls = [
 "http://1.196.55.1:9901",
 "http://1.197.249.1:9901",
@@ -153,196 +185,165 @@ urls = [
 "http://61.156.228.1:8154",
 "http://61.173.144.1:9901"
     ]
-def modify_urls(url):
-    modified_urls = []
-    ip_start_index = url.find("//") + 2
-    ip_end_index = url.find(":", ip_start_index)
-    base_url = url[:ip_start_index]  # http:// or https://
-    ip_address = url[ip_start_index:ip_end_index]
-    port = url[ip_end_index:]
-    ip_end = "/iptv/live/1000.json?key=txiptv"
-    for i in range(1, 256):
-        modified_ip = f"{ip_address[:-1]}{i}"
-        modified_url = f"{base_url}{modified_ip}{port}{ip_end}"
-        modified_urls.append(modified_url)
-    return modified_urls
-def is_url_accessible(url):
-    try:
-        response = requests.get(url, timeout=0.5)
-        if response.status_code == 200:
-            return url
-    except requests.exceptions.RequestException:
-        pass
-    return None
-results = []
-x_urls = []
-for url in urls:  # 对urls进行处理，ip第四位修改为1，并去重
-    url = url.strip()
-    ip_start_index = url.find("//") + 2
-    ip_end_index = url.find(":", ip_start_index)
-    ip_dot_start = url.find(".") + 1
-    ip_dot_second = url.find(".", ip_dot_start) + 1
-    ip_dot_three = url.find(".", ip_dot_second) + 1
-    base_url = url[:ip_start_index]  # http:// or https://
-    ip_address = url[ip_start_index:ip_dot_three]
-    port = url[ip_end_index:]
-    ip_end = "1"
-    modified_ip = f"{ip_address}{ip_end}"
-    x_url = f"{base_url}{modified_ip}{port}"
-    x_urls.append(x_url)
-urls = set(x_urls)  # 去重得到唯一的URL列表
-valid_urls = []
-#   多线程获取可用url
-with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
-    futures = []
-    for url in urls:
-        url = url.strip()
-        modified_urls = modify_urls(url)
-        for modified_url in modified_urls:
-            futures.append(executor.submit(is_url_accessible, modified_url))
-    for future in concurrent.futures.as_completed(futures):
-        result = future.result()
-        if result:
-            valid_urls.append(result)
-for url in valid_urls:
-    print(url)
-# 遍历网址列表，获取JSON文件并解析
-for url in valid_urls:
-    try:
-        # 发送GET请求获取JSON文件，设置超时时间为0.5秒
-        ip_start_index = url.find("//") + 2
-        ip_dot_start = url.find(".") + 1
-        ip_index_second = url.find("/", ip_dot_start)
-        base_url = url[:ip_start_index]  # http:// or https://
-        ip_address = url[ip_start_index:ip_index_second]
-        url_x = f"{base_url}{ip_address}"
-        json_url = f"{url}"
-        response = requests.get(json_url, timeout=0.5)
-        json_data = response.json()
+# 种子地址所在的 /24 网段，返回 {(前三段IP, 端口)}
+def seed_subnets(seed_urls):
+    subnets = set()
+    for url in seed_urls:
+        parsed_url = urlparse(url.strip())
+        if parsed_url.hostname and parsed_url.port:
+            subnets.add((parsed_url.hostname.rsplit('.', 1)[0], parsed_url.port))
+    return subnets
+class RateLimiter:
+    """按固定速率发放令牌，用于限制每秒发起的 TCP 连接数"""
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_time = 0.0
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.next_time < now:
+            self.next_time = now
+        delay = self.next_time - now
+        self.next_time += self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+# 第一阶段：只做 TCP 连接，端口能连上说明主机在线
+async def is_port_open(host, port, slots, limiter):
+    async with slots:
+        await limiter.wait()
         try:
-            # 解析JSON文件，获取name和url字段
-            for item in json_data['data']:
-                if isinstance(item, dict):
-                    name = item.get('name')
-                    urlx = item.get('url')
-                    if ',' in urlx:
-                        urlx=f"aaaaaaaa"
-                    #if 'http' in urlx or 'udp' in urlx or 'rtp' in urlx:
-                    if 'http' in urlx:
-                        urld = f"{urlx}"
-                    else:
-                        urld = f"{url_x}{urlx}"
-                    if name and urlx:
-                        # 删除特定文字
-                        name = name.replace("cctv", "CCTV")
-                        name = name.replace("中央", "CCTV")
-                        name = name.replace("央视", "CCTV")
-                        name = name.replace("高清", "")
-                        name = name.replace("超高", "")
-                        name = name.replace("HD", "")
-                        name = name.replace("标清", "")
-                        name = name.replace("频道", "")
-                        name = name.replace("-", "")
-                        name = name.replace(" ", "")
-                        name = name.replace("PLUS", "+")
-                        name = name.replace("＋", "+")
-                        name = name.replace("(", "")
-                        name = name.replace(")", "")
-                        name = re.sub(r"CCTV(\d+)台", r"CCTV\1", name)
-                        name = name.replace("CCTV1综合", "CCTV1")
-                        name = name.replace("CCTV2财经", "CCTV2")
-                        name = name.replace("CCTV3综艺", "CCTV3")
-                        name = name.replace("CCTV4国际", "CCTV4")
-                        name = name.replace("CCTV4中文国际", "CCTV4")
-                        name = name.replace("CCTV4欧洲", "CCTV4")
-                        name = name.replace("CCTV5体育", "CCTV5")
-                        name = name.replace("CCTV6电影", "CCTV6")
-                        name = name.replace("CCTV7军事", "CCTV7")
-                        name = name.replace("CCTV7军农", "CCTV7")
-                        name = name.replace("CCTV7农业", "CCTV7")
-                        name = name.replace("CCTV7国防军事", "CCTV7")
-                        name = name.replace("CCTV8电视剧", "CCTV8")
-                        name = name.replace("CCTV9记录", "CCTV9")
-                        name = name.replace("CCTV9纪录", "CCTV9")
-                        name = name.replace("CCTV10科教", "CCTV10")
-                        name = name.replace("CCTV11戏曲", "CCTV11")
-                        name = name.replace("CCTV12社会与法", "CCTV12")
-                        name = name.replace("CCTV13新闻", "CCTV13")
-                        name = name.replace("CCTV新闻", "CCTV13")
-                        name = name.replace("CCTV14少儿", "CCTV14")
-                        name = name.replace("CCTV15音乐", "CCTV15")
-                        name = name.replace("CCTV16奥林匹克", "CCTV16")
-                        name = name.replace("CCTV17农业农村", "CCTV17")
-                        name = name.replace("CCTV17农业", "CCTV17")
-                        name = name.replace("CCTV5+体育赛视", "CCTV5+")
-                        name = name.replace("CCTV5+体育赛事", "CCTV5+")
-                        name = name.replace("CCTV5+体育", "CCTV5+")
-                        name = name.replace("苏州生活咨讯", "苏州生活")
-                        results.append(f"{name},{urld}")
-        except:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), SCAN_CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        with contextlib.suppress(OSError):
+            await writer.wait_closed()
+        return True
+# 解析酒店源 JSON 接口返回的频道列表，相对地址补全为 http://IP:端口 开头，频道名称随即标准化
+def parse_channel_list(url, json_data):
+    parsed = urlparse(url)
+    base_url = f"{parsed.scheme}://{parsed.netloc}"
+    channels = []
+    items = json_data.get('data') if isinstance(json_data, dict) else None
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
             continue
-    except:
-        continue
-channels = []
-for result in results:
-    line = result.strip()
-    if result:
-        channel_name, channel_url = result.split(',')
-        channels.append((channel_name, channel_url))
-# 线程安全的队列，用于存储下载任务
-task_queue = Queue()
-# 线程安全的列表，用于存储结果
-results = []
-error_channels = []
-# 定义工作线程函数
-def worker():
-    while True:
-        # 从队列中获取一个任务
-        channel_name, channel_url = task_queue.get()
+        name = item.get('name')
+        urlx = item.get('url')
+        if not name or not isinstance(urlx, str) or not urlx or ',' in urlx:
+            continue
+        urld = urlx if 'http' in urlx else f"{base_url}{urlx}"
+        channels.append((NAME_NORMALIZER.normalize(name), urld))
+    return channels
+# 第二阶段：只对端口开放的主机请求 JSON 接口，响应到达后立即解析，返回 (地址, 频道列表)
+async def is_url_accessible(session, url, slots):
+    async with slots:
         try:
-            channel_url_t = channel_url.rstrip(channel_url.split('/')[-1])  # m3u8链接前缀
-            lines = requests.get(channel_url, timeout = 1).text.strip().split('\n')  # 获取m3u8文件内容
-            ts_lists = [line.split('/')[-1] for line in lines if line.startswith('#') == False]  # 获取m3u8文件下视频流后缀
-            ts_lists_0 = ts_lists[0].rstrip(ts_lists[0].split('.ts')[-1])  # m3u8链接前缀
-            ts_url = channel_url_t + ts_lists[0]  # 拼接单个视频片段下载链接
-            # 多获取的视频数据进行5秒钟限制
-            with eventlet.Timeout(5, False):
-                start_time = time.time()
-                content = requests.get(ts_url, timeout = 1).content
-                end_time = time.time()
-                response_time = (end_time - start_time) * 1
-            if content:
-                with open(ts_lists_0, 'ab') as f:
-                    f.write(content)  # 写入文件
-                file_size = len(content)
-                # print(f"文件大小：{file_size} 字节")
-                download_speed = file_size / response_time / 1024
-                # print(f"下载速度：{download_speed:.3f} kB/s")
-                normalized_speed = min(max(download_speed / 1024, 0.001), 100)  # 将速率从kB/s转换为MB/s并限制在1~100之间
-                #print(f"标准化后的速率：{normalized_speed:.3f} MB/s")
-                # 删除下载的文件
-                os.remove(ts_lists_0)
-                result = channel_name, channel_url, f"{normalized_speed:.3f} MB/s"
-                results.append(result)
-                numberx = (len(results) + len(error_channels)) / len(channels) * 100
-                print(f"可用频道：{len(results)} 个 , 不可用频道：{len(error_channels)} 个 , 总频道：{len(channels)} 个 ,总进度：{numberx:.2f} %。")
-        except:
-            error_channel = channel_name, channel_url
-            error_channels.append(error_channel)
-            numberx = (len(results) + len(error_channels)) / len(channels) * 100
-            print(f"可用频道：{len(results)} 个 , 不可用频道：{len(error_channels)} 个 , 总频道：{len(channels)} 个 ,总进度：{numberx:.2f} %。")
-        # 标记任务完成
-        task_queue.task_done()
-# 创建多个工作线程
-num_threads = 10
-for _ in range(num_threads):
-    t = threading.Thread(target=worker, daemon=True)  # 将工作线程设置为守护线程
-    t.start()
-# 添加下载任务到队列
-for channel in channels:
-    task_queue.put(channel)
-# 等待所有任务完成
-task_queue.join()
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return None
+                try:
+                    json_data = await response.json(content_type=None)
+                except ValueError:
+                    return url, []
+                return url, parse_channel_list(url, json_data)
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError):
+            return None
+# 两阶段扫描一批主机，targets 为 [(前三段IP, 端口, 第四段)]，返回 {target: (JSON 地址, 频道列表)}
+async def scan_hosts(targets):
+    slots = asyncio.Semaphore(SCAN_CONCURRENCY)
+    limiter = RateLimiter(SCAN_CONNECT_RATE)
+    port_open = await asyncio.gather(*[is_port_open(f"{prefix}.{octet}", port, slots, limiter) for prefix, port, octet in targets])
+    open_targets = [target for target, is_open in zip(targets, port_open) if is_open]
+    print(f"TCP 扫描完成：{len(targets)} 个地址中 {len(open_targets)} 个端口开放")
+    timeout = aiohttp.ClientTimeout(total=JSON_TOTAL_TIMEOUT, sock_connect=SCAN_CONNECT_TIMEOUT, sock_read=JSON_READ_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=JSON_CHECK_CONCURRENCY, limit_per_host=JSON_CHECK_PER_HOST)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        http_slots = asyncio.Semaphore(JSON_CHECK_CONCURRENCY)
+        found = await asyncio.gather(*[is_url_accessible(session, f"http://{prefix}.{octet}:{port}{JSON_PATH}", http_slots) for prefix, port, octet in open_targets])
+    return {target: result for target, result in zip(open_targets, found) if result}
+# 读取主机命中表：{"前三段IP:端口": {"hosts": {第四段: 最近可用时间}, "full_scan": 最近整段扫描时间}}
+def load_host_table(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+def save_host_table(path, table):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(table, f, separators=(',', ':'), sort_keys=True)
+# 先探测各网段上次可用的主机；整段扫描只在到期或已知主机全部失效时进行，返回 [(JSON 地址, 频道列表)]
+async def scan_subnets(subnets, table):
+    now = int(time.time())
+    entries = {}
+    for prefix, port in subnets:
+        entry = table.setdefault(f"{prefix}:{port}", {"hosts": {}, "full_scan": 0})
+        entry["hosts"] = {octet: seen for octet, seen in entry["hosts"].items() if now - seen < HOST_RETENTION}
+        entries[(prefix, port)] = entry
+    known_targets = [(prefix, port, int(octet)) for (prefix, port), entry in entries.items() for octet in entry["hosts"]]
+    found = await scan_hosts(known_targets) if known_targets else {}
+    print(f"已知主机 {len(known_targets)} 个，其中 {len(found)} 个可用")
+    answered = {(prefix, port) for prefix, port, _ in found}
+    sweep_subnets = [subnet for subnet, entry in entries.items()
+                     if now - entry["full_scan"] > FULL_SCAN_INTERVAL or subnet not in answered]
+    known = set(known_targets)
+    sweep_targets = [(prefix, port, octet) for prefix, port in sweep_subnets for octet in range(1, 256) if (prefix, port, octet) not in known]
+    if sweep_targets:
+        print(f"整段扫描 {len(sweep_subnets)} 个网段")
+        found.update(await scan_hosts(sweep_targets))
+        for subnet in sweep_subnets:
+            entries[subnet]["full_scan"] = now
+    for prefix, port, octet in found:
+        entries[(prefix, port)]["hosts"][str(octet)] = now
+    return list(found.values())
+# 单个频道测速：连续下载几个视频片段，得到可持续播放比例和下载速度；先占用网关的名额再占用全局名额，超出预算的测速会被取消；失败返回 None
+async def speed_test(session, channel, slots, gateway_slots):
+    channel_name, channel_url = channel
+    async with gateway_slots[urlparse(channel_url).netloc]:
+        async with slots:
+            try:
+                score = await asyncio.wait_for(
+                    hls.probe_stream(session, channel_url, SPEED_TEST_SEGMENTS, SPEED_TEST_WINDOW, SPEED_TEST_MAX_BYTES),
+                    SPEED_TEST_BUDGET)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                return None
+    if score is None:
+        return None
+    return channel_name, channel_url, score.sustain, score.throughput
+# 对所有频道并发测速，结果从各任务的返回值中收集，返回 [(频道名称, 地址, 可持续播放比例, 字节/秒)]
+async def speed_test_all(channels):
+    slots = asyncio.Semaphore(SPEED_TEST_CONCURRENCY)
+    gateway_slots = defaultdict(lambda: asyncio.Semaphore(SPEED_TEST_PER_GATEWAY))
+    # 批量预解析频道地址中的主机名，无法解析的频道直接记为不可用；测速连接同样使用这份解析缓存
+    dns = DnsCache()
+    await dns.prefetch(channel_url for _, channel_url in channels)
+    failed = sum(1 for _, channel_url in channels if not dns.is_resolvable(channel_url))
+    channels_to_test = [channel for channel in channels if dns.is_resolvable(channel[1])]
+    timeout = aiohttp.ClientTimeout(sock_connect=1, sock_read=1)
+    connector = aiohttp.TCPConnector(limit=SPEED_TEST_CONCURRENCY, limit_per_host=SPEED_TEST_PER_GATEWAY, resolver=CachedResolver(dns))
+    speeds = []
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        tasks = [speed_test(session, channel, slots, gateway_slots) for channel in channels_to_test]
+        for done in asyncio.as_completed(tasks):
+            result = await done
+            if result:
+                speeds.append(result)
+            else:
+                failed += 1
+            numberx = (len(speeds) + failed) / len(channels) * 100
+            print(f"可用频道：{len(speeds)} 个 , 不可用频道：{failed} 个 , 总频道：{len(channels)} 个 ,总进度：{numberx:.2f} %。")
+    return speeds
+#   两阶段扫描获取可用url及其频道列表：先 TCP 连接扫描，再对开放端口请求并解析 JSON 接口；已知可用的主机优先
+host_table = load_host_table(HOST_TABLE_FILE)
+valid_urls = asyncio.run(scan_subnets(seed_subnets(urls), host_table))
+save_host_table(HOST_TABLE_FILE, host_table)
+channels = []
+for url, url_channels in valid_urls:
+    print(url)
+    channels.extend(url_channels)
+#   异步测速：全局和单个网关的并发分别受限，每个频道的测速有 SPEED_TEST_BUDGET 秒的总预算
+results = asyncio.run(speed_test_all(channels))
 def channel_key(channel_name):
     match = re.search(r'\d+', channel_name)
     if match:
@@ -350,14 +351,14 @@ def channel_key(channel_name):
     else:
         return float('inf')  # 返回一个无穷大的数字作为关键字
 # 对频道进行排序
-results.sort(key=lambda x: (x[0], -float(x[2].split()[0])))
+results.sort(key=lambda x: (x[0], -min(x[2], SUSTAIN_TARGET), -x[3]))
 results.sort(key=lambda x: channel_key(x[0]))
 result_counter = 10  # 每个频道需要的个数
 with open("itvlist.txt", 'w', encoding='utf-8') as file:
     channel_counters = {}
     file.write('央视频道,#genre#\n')
     for result in results:
-        channel_name, channel_url, speed = result
+        channel_name, channel_url, sustain, speed = result
         if 'CCTV' in channel_name:
             if channel_name in channel_counters:
                 if channel_counters[channel_name] >= result_counter:
@@ -371,7 +372,7 @@ with open("itvlist.txt", 'w', encoding='utf-8') as file:
     channel_counters = {}
     file.write('卫视频道,#genre#\n')
     for result in results:
-        channel_name, channel_url, speed = result
+        channel_name, channel_url, sustain, speed = result
         if '卫视' in channel_name:
             if channel_name in channel_counters:
                 if channel_counters[channel_name] >= result_counter:
@@ -385,7 +386,7 @@ with open("itvlist.txt", 'w', encoding='utf-8') as file:
     channel_counters = {}
     file.write('江苏频道,#genre#\n')
     for result in results:
-        channel_name, channel_url, speed = result
+        channel_name, channel_url, sustain, speed = result
         if '苏州生活' in channel_name:
             if channel_name in channel_counters:
                 if channel_counters[channel_name] >= result_counter:
@@ -400,7 +401,7 @@ with open("itvlist.m3u", 'w', encoding='utf-8') as file:
     channel_counters = {}
     file.write('#EXTM3U\n')
     for result in results:
-        channel_name, channel_url, speed = result
+        channel_name, channel_url, sustain, speed = result
         if 'CCTV' in channel_name:
             if channel_name in channel_counters:
                 if channel_counters[channel_name] >= result_counter:
@@ -416,7 +417,7 @@ with open("itvlist.m3u", 'w', encoding='utf-8') as file:
     channel_counters = {}
     #file.write('卫视频道,#genre#\n')
     for result in results:
-        channel_name, channel_url, speed = result
+        channel_name, channel_url, sustain, speed = result
         if '卫视' in channel_name:
             if channel_name in channel_counters:
                 if channel_counters[channel_name] >= result_counter:
@@ -432,7 +433,7 @@ with open("itvlist.m3u", 'w', encoding='utf-8') as file:
     channel_counters = {}
     #file.write('江苏频道,#genre#\n')
     for result in results:
-        channel_name, channel_url, speed = result
+        channel_name, channel_url, sustain, speed = result
         if '苏州生活' in channel_name:
             if channel_name in channel_counters:
                 if channel_counters[channel_name] >= result_counter:
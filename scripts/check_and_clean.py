@@ -1,9 +1,20 @@
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
 import os
+import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import re
 import time
 
+# 以仓库根目录为导入路径，以便使用 common 包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import hls
+from common.circuit_breaker import HostCircuitBreaker, host_key
+from common.config import load_config
+from common.dns_cache import DnsCache
+from common.verdict_cache import VerdictCache
+
 print("--- DEBUG: Script Execution Started ---") # 强制启动日志
 
 # 配置文件和输入/输出文件路径
@@ -15,12 +26,42 @@ OUTPUT_VALID_M3U_FILE = 'output/final_valid_list.m3u'
 TIMEOUT = 5             # 每个链接的测试超时时间（秒）
 MAX_WORKERS = 20        # 并行测试的线程数
 MAX_LINKS_PER_CHANNEL = 50 # 每个频道最多测试多少个链接
+MAX_CONNECTIONS_PER_HOST = 8 # 同一主机最多保持的连接数，超出时等待空闲连接
+
+# 深度检测：设置环境变量 CHECK_DEEP=1 时用分段 GET 读取并解析播放列表，再读取第一个视频片段的开头
+DEEP_CHECK = os.environ.get('CHECK_DEEP') == '1'
+PLAYLIST_RANGE_BYTES = 64 * 1024  # 读取播放列表的字节数上限
+SEGMENT_PROBE_BYTES = 1024        # 读取视频片段开头的字节数
+DEEP_VERDICT_FILE = 'probe_verdicts_deep.sqlite'  # 深度检测的结论单独缓存
+
+# 探测结论缓存，在 main() 中按 config.yaml 初始化；为 None 时不使用缓存
+VERDICT_CACHE = None
+
+# 所有线程共用的 HTTP 会话，在 main() 中创建
+SESSION = None
+
+# 主机熔断：同一主机连续连接失败 BREAKER_THRESHOLD 次后，其余链接直接判为失败，BREAKER_RESET_TIMEOUT 秒后再试探
+BREAKER_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 60
+BREAKER = HostCircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET_TIMEOUT)
 
 # 排除关键字列表 (不区分大小写)
 EXCLUDE_KEYWORDS = ['广播', '音乐', '.SPORTS.', '之声', '之音','Radio', '电台']
 
 # ------------------ 辅助函数 ------------------
 
+def create_session(pool_size):
+    """
+    创建带连接池的 requests 会话：连接按主机复用（keep-alive），
+    最多缓存 pool_size 个主机的连接池，每个主机最多 MAX_CONNECTIONS_PER_HOST 个连接。
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=MAX_CONNECTIONS_PER_HOST, pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = 'Mozilla/5.0' # 模拟浏览器
+    return session
+
 def is_stream_content(response):
     """
     检查 HTTP 响应头中的 Content-Type，判断是否可能是视频流。
@@ -48,6 +89,74 @@ def is_stream_content(response):
     # 如果状态码是 200/302 且没有明确的文本类型，我们倾向于认为是有效的（保守策略）
     return True
 
+def ranged_get(url, size):
+    """
+    分段 GET：只请求并读取前 size 字节，读够即关闭连接。
+    返回 (最终地址, Content-Type, 读到的字节)；状态码不是 200/206 时返回 None。
+    """
+    headers = {'Range': f'bytes=0-{size - 1}'}
+    with SESSION.get(url, headers=headers, timeout=TIMEOUT, allow_redirects=True, stream=True) as response:
+        if response.status_code not in (200, 206):
+            return None
+        body = b''
+        for chunk in response.iter_content(min(size, 16 * 1024)):
+            body += chunk
+            if len(body) >= size:
+                break
+        return response.url, response.headers.get('Content-Type', '').lower(), body[:size]
+
+def read_playlist(url):
+    """读取并解析播放列表；不是 m3u8 时返回 (None, Content-Type, 读到的字节)"""
+    result = ranged_get(url, PLAYLIST_RANGE_BYTES)
+    if result is None:
+        return None, '', b''
+    final_url, content_type, body = result
+    text = body.decode('utf-8', errors='replace')
+    if not hls.is_playlist(text):
+        return None, content_type, body
+    if len(body) >= PLAYLIST_RANGE_BYTES:
+        text = text.rsplit('\n', 1)[0]  # 截断处的最后一行不完整
+    return hls.parse_playlist(text, final_url), content_type, body
+
+def looks_like_stream(content_type, body):
+    """
+    非 m3u8 链接：读到了数据且不是网页、图片或纯文本时视为视频流；
+    DASH 的 MPD 清单（application/dash+xml 或内容以 <MPD 开头）同样视为有效。
+    """
+    if not body:
+        return False
+    head = body[:512].lstrip().lower()
+    if 'dash+xml' in content_type or b'<mpd' in head:
+        return True
+    if 'text/html' in content_type or 'text/plain' in content_type or 'image/' in content_type:
+        return False
+    return not head.startswith((b'<!doctype', b'<html', b'<?xml', b'{'))
+
+def deep_check_link(link):
+    """
+    深度检测单个链接：分段读取播放列表，主播放列表跟随第一个子列表一次，
+    再读取第一个视频片段的前 SEGMENT_PROBE_BYTES 字节；能确认或否定时立即返回。
+    只有读取链接本身时的连接失败和超时向上抛出（计入该主机的熔断统计），
+    子列表和视频片段常在其他 CDN 主机上，它们的连接失败只判该链接无效。
+    """
+    playlist, content_type, body = read_playlist(link)
+    if playlist is None:
+        return looks_like_stream(content_type, body)
+    try:
+        if playlist.variants:
+            playlist, content_type, body = read_playlist(playlist.variants[0].url)
+            if playlist is None:
+                return False
+        if not playlist.segments:
+            return False
+        result = ranged_get(playlist.segments[0].url, SEGMENT_PROBE_BYTES)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        return False
+    if result is None:
+        return False
+    _, content_type, body = result
+    return looks_like_stream(content_type, body)
+
 def check_link_validity(link_info):
     """
     测试单个链接的有效性，使用 HEAD 请求和超时。
@@ -59,31 +168,55 @@ def check_link_validity(link_info):
     if not link.lower().startswith(('http', 'https')):
         print(f"SKIP (Protocol): {name} - Non-HTTP link: {link}")
         return None
-        
+
+    # 有效期内已有探测结论的链接直接复用，不再发请求
+    if VERDICT_CACHE is not None:
+        cached = VERDICT_CACHE.get(link)
+        if cached is not None:
+            return link_info if cached[0] else None
+
+    # 主机已被熔断：不发请求，也不写入缓存
+    host = host_key(link)
+    trial = BREAKER.allow(host)
+    if not trial:
+        return None
+
+    is_valid = False
+    transient = False
+    start_time = time.time()
     try:
-        # 使用 HEAD 请求，只获取头部信息，速度更快
-        response = requests.head(
-            link, 
-            timeout=TIMEOUT, 
-            allow_redirects=True, # 允许重定向
-            headers={'User-Agent': 'Mozilla/5.0'} # 模拟浏览器
-        )
-        
-        # 检查状态码
-        if response.status_code in (200, 301, 302):
-            # 检查内容类型
-            if is_stream_content(response):
-                print(f"SUCCESS (Status {response.status_code}): {name}")
-                return link_info # 返回 (频道名, 链接)
+        if DEEP_CHECK:
+            is_valid = deep_check_link(link)
+            if is_valid:
+                print(f"SUCCESS (Deep): {name}")
+        else:
+            # 使用 HEAD 请求，只获取头部信息，速度更快
+            response = SESSION.head(
+                link, 
+                timeout=TIMEOUT, 
+                allow_redirects=True, # 允许重定向
+            )
+            
+            # 检查状态码
+            if response.status_code in (200, 301, 302):
+                # 检查内容类型
+                if is_stream_content(response):
+                    print(f"SUCCESS (Status {response.status_code}): {name}")
+                    is_valid = True
+                else:
+                    # 打印内容类型失败的详细信息
+                    # print(f"FAIL (Content Type {response.headers.get('Content-Type')}): {name}") # 保持原有日志输出
+                    pass
             else:
-                # 打印内容类型失败的详细信息
-                # print(f"FAIL (Content Type {response.headers.get('Content-Type')}): {name}") # 保持原有日志输出
+                # 打印状态码失败的详细信息
+                # print(f"FAIL (Status {response.status_code}): {name}") # 保持原有日志输出
                 pass
-        else:
-            # 打印状态码失败的详细信息
-            # print(f"FAIL (Status {response.status_code}): {name}") # 保持原有日志输出
-            pass
+        BREAKER.record_success(host)
             
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        # 超时、拒绝连接等连接失败计入熔断统计，结论只短期缓存
+        BREAKER.record_failure(host)
+        transient = True
     except requests.exceptions.RequestException as e:
         # 打印请求异常的详细信息 (超时、连接错误等)
         # print(f"FAIL (Error {type(e).__name__}): {name} - Link prefix: {link[:50]}...") # 保持原有日志输出
@@ -92,12 +225,19 @@ def check_link_validity(link_info):
         # 打印其他未知错误
         # print(f"FAIL (Unknown Error): {name} - {e}") # 保持原有日志输出
         pass
-        
-    return None
+    finally:
+        # 没有记录成功或失败时（其他请求异常）也要释放半开试探名额
+        BREAKER.release(host, trial)
+
+    if VERDICT_CACHE is not None:
+        VERDICT_CACHE.put(link, is_valid, (time.time() - start_time) * 1000, transient=transient)
+    return link_info if is_valid else None
 
 # ------------------ 主逻辑函数 ------------------
 
 def main():
+    global VERDICT_CACHE, SESSION
+
     if not os.path.exists(INPUT_TXT_FILE):
         print(f"Error: Input file {INPUT_TXT_FILE} not found. Run update_list.py first.")
         return
@@ -156,20 +296,39 @@ def main():
     if excluded_channels_count > 0:
         print(f"Note: {excluded_channels_count} channel links were excluded based on keywords: {', '.join(EXCLUDE_KEYWORDS)}") 
         
-    print(f"Starting validity check with {MAX_WORKERS} concurrent workers and {TIMEOUT}s timeout...")
+    # 批量预解析所有主机名，无法解析的链接不再提交测试
+    dns = DnsCache()
+    host_count = asyncio.run(dns.prefetch(link for _, link in raw_channels))
+    resolvable_channels = [ch_info for ch_info in raw_channels if dns.is_resolvable(ch_info[1])]
+    print(f"Resolved {host_count} hosts, dropped {len(raw_channels) - len(resolvable_channels)} links with unresolvable hosts.")
+    raw_channels = resolvable_channels
+
+    print(f"Starting {'deep ' if DEEP_CHECK else ''}validity check with {MAX_WORKERS} concurrent workers and {TIMEOUT}s timeout...")
     start_time = time.time()
 
     # 2. 并行测试所有链接
     valid_links = []
-    
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # 提交所有链接到线程池进行测试
-        future_to_link = {executor.submit(check_link_validity, ch_info): ch_info for ch_info in raw_channels}
-        
-        for future in as_completed(future_to_link):
-            result = future.result()
-            if result:
-                valid_links.append(result)
+    config = load_config()
+    SESSION = create_session(config.get('network', {}).get('requests_pool_size', 100))
+    # HEAD 检测的结论按探测方式单独记录，不复用 tv.py 的结论（GET 只看状态码，不检查 Content-Type）
+    if DEEP_CHECK:
+        VERDICT_CACHE = VerdictCache.from_config(config, DEEP_VERDICT_FILE, method='deep')
+    else:
+        VERDICT_CACHE = VerdictCache.from_config(config, method='head')
+
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            # 提交所有链接到线程池进行测试
+            future_to_link = {executor.submit(check_link_validity, ch_info): ch_info for ch_info in raw_channels}
+
+            for future in as_completed(future_to_link):
+                result = future.result()
+                if result:
+                    valid_links.append(result)
+    finally:
+        SESSION.close()
+        if VERDICT_CACHE is not None:
+            VERDICT_CACHE.close()
 
     end_time = time.time()
     valid_count = len(valid_links)
@@ -1,86 +1,82 @@
 import requests
 import re
 import os
+import sys
+import hashlib
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+# 以仓库根目录为导入路径，以便使用 common 包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.config import load_config
+from common.playlist_parser import CHUNK_SIZE, MAX_SOURCE_BYTES, iter_lines, iter_playlist
+from common.source_cache import SourceCache
+
 # 配置文件和输出文件路径
 URLS_FILE = 'config/urls.txt' 
 OUTPUT_FILE = 'output/tv_list.m3u'
 OUTPUT_TXT_FILE = 'output/tv_list.txt'
 MAX_WORKERS = 10 
+SOURCE_CACHE_KIND = 'update_list' # 源缓存中本脚本解析结果的类别名
+DEFAULT_GROUP = 'Other' # 没有 group-title / #genre# 分组时使用的类别
 
 # --- M3U 文件解析函数 ---
-def parse_m3u_content(content):
+def parse_m3u_content(lines):
     """
     解析 M3U 或类似 IPTV 列表内容，提取频道信息。
-    此函数现在支持两种常见的格式：M3U 和 频道名称,链接 格式。
+    lines 为逐行产出的文本（见 common.playlist_parser.iter_lines），支持 M3U 和 频道名称,链接 两种格式。
     返回: { (频道名, 频道类别): 链接列表 }
     """
-    lines = content.splitlines()
     channels = {}
-    channel_info = None
-    
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith('#'):
-            channel_info = None
-            
-        if line.startswith('#EXTINF:'):
-            # 1. M3U 格式的频道信息行
-            
-            # 提取 group-title
-            group_match = re.search(r'group-title="([^"]*)"', line)
-            group_title = group_match.group(1).strip() if group_match else "Other"
-            
-            # 提取频道名称 (逗号后的内容)
-            name_match = re.search(r',\s*([^,]+)$', line)
-            channel_name = name_match.group(1).strip() if name_match else None
-            
-            if channel_name:
-                channel_info = (channel_name, group_title)
-        
-        elif line.startswith('http') or line.startswith('rtp'):
-            # 2. M3U 格式的链接行
-            link = line
-            key = channel_info
-            
-            # 如果是链接行，并且前面已经解析到频道信息，则将其添加到频道列表
-            if key and key[0] and key[1]:
-                if key not in channels:
-                    channels[key] = set()
-                channels[key].add(link)
-                channel_info = None # M3U格式通常是一行EXTINF接一行链接
-            
-        elif ',' in line and ('http' in line or 'rtp' in line):
-            # 3. TXT 格式 (频道名称,链接) 的兜底解析
-            
-            # 分割为 频道名称 和 链接
-            # 注意：逗号可能出现在频道名称中，但链接中不包含，所以我们从右边开始分割
-            parts = line.rsplit(',', 1)
-            if len(parts) == 2:
-                channel_name = parts[0].strip()
-                link = parts[1].strip()
-                
-                # 针对您提供的台湾源，频道名称有时可能带有 (数字,，例如：公視(１３,
-                # 我们尝试清理一下频道名称
-                channel_name = re.sub(r'\(.*?,', '', channel_name).strip() 
-                
-                if channel_name and link:
-                    key = (channel_name, "TXT_Import") # 默认类别
-                    if key not in channels:
-                        channels[key] = set()
-                    channels[key].add(link)
+    for channel_name, group_title, link in iter_playlist(lines):
+        # 针对您提供的台湾源，频道名称有时可能带有 (数字,，例如：公視(１３,
+        # 我们尝试清理一下频道名称
+        channel_name = re.sub(r'\(.*?,', '', channel_name).strip()
+        if channel_name:
+            key = (channel_name, group_title or DEFAULT_GROUP)
+            if key not in channels:
+                channels[key] = set()
+            channels[key].add(link)
+
+    return channels
+
+# --- 源缓存记录与频道字典互转 ---
+def channels_to_records(channels):
+    return [[name, group, link] for (name, group), links in channels.items() for link in sorted(links)]
 
+def records_to_channels(records):
+    channels = {}
+    for name, group, link in records:
+        channels.setdefault((name, group), set()).add(link)
     return channels
 
 # --- URL 下载与处理函数 ---
-def download_url(url):
+def download_url(url, sources=None):
     try:
         print(f"Downloading: {url}")
+        entry = sources.lookup(SOURCE_CACHE_KIND, url) if sources is not None else None
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(url, timeout=15, headers=headers)
-        response.raise_for_status() 
-        return parse_m3u_content(response.text)
+        headers.update(SourceCache.conditional_headers(entry))
+        with requests.get(url, timeout=15, headers=headers, stream=True) as response:
+            # 源未变化：直接复用上次的解析结果
+            if response.status_code == 304 and entry is not None:
+                sources.touch(SOURCE_CACHE_KIND, url)
+                print(f"Not modified, using cache: {url}")
+                return records_to_channels(entry.records)
+            response.raise_for_status() 
+
+            # 边下载边解析，单个源的读取量受 MAX_SOURCE_BYTES 限制
+            hasher = hashlib.sha256()
+            lines = iter_lines(response.iter_content(CHUNK_SIZE), MAX_SOURCE_BYTES, hasher, url)
+            channels = parse_m3u_content(lines)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+
+        if sources is not None:
+            if entry is not None and entry.content_hash == hasher.hexdigest():
+                sources.touch(SOURCE_CACHE_KIND, url, etag, last_modified)
+            else:
+                sources.store(SOURCE_CACHE_KIND, url, etag, last_modified, hasher.hexdigest(), channels_to_records(channels))
+        return channels
         
     except requests.exceptions.RequestException as e:
         print(f"Error downloading {url}: {e}")
@@ -107,21 +103,27 @@ def main():
 
     # 2. 并行下载和解析所有 URL 
     all_channels = {} 
+    config = load_config()
+    sources = SourceCache.from_config(config)
     
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_url = {executor.submit(download_url, url): url for url in urls}
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            future_to_url = {executor.submit(download_url, url, sources): url for url in urls}
         
-        for future in as_completed(future_to_url):
-            try:
-                result = future.result()
-                for key, links in result.items():
-                    # 核心逻辑: 不进行过滤，全部添加
-                    if key not in all_channels:
-                        all_channels[key] = set()
-                    all_channels[key].update(links) 
-            except Exception as e:
-                url = future_to_url[future]
-                print(f"{url} generated an exception: {e}")
+            for future in as_completed(future_to_url):
+                try:
+                    result = future.result()
+                    for key, links in result.items():
+                        # 核心逻辑: 不进行过滤，全部添加
+                        if key not in all_channels:
+                            all_channels[key] = set()
+                        all_channels[key].update(links) 
+                except Exception as e:
+                    url = future_to_url[future]
+                    print(f"{url} generated an exception: {e}")
+    finally:
+        if sources is not None:
+            sources.close()
 
     # 3. 生成最终的 M3U 和 TXT 文件内容
     output_content = ["#EXTM3U"]
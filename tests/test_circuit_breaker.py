@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from common.circuit_breaker import HostCircuitBreaker
+from common.probe import ProbeEngine
+
+HOST = "example.com:80"
+
+
+def test_half_open_allows_one_trial():
+    breaker = HostCircuitBreaker(threshold=2, reset_timeout=0)
+    for _ in range(2):
+        breaker.record_failure(HOST)
+    assert breaker.allow(HOST)
+    assert not breaker.allow(HOST)
+    breaker.record_success(HOST)
+    assert breaker.allow(HOST)
+
+
+def test_half_open_trial_without_verdict_is_released():
+    breaker = HostCircuitBreaker(threshold=2, reset_timeout=0)
+    for _ in range(2):
+        breaker.record_failure(HOST)
+    trial = breaker.allow(HOST)
+    assert trial
+    breaker.release(HOST, trial)
+    assert breaker.allow(HOST)
+
+
+def test_stale_request_does_not_release_trial():
+    breaker = HostCircuitBreaker(threshold=1, reset_timeout=0)
+    stale = breaker.allow(HOST)
+    breaker.record_failure(HOST)
+    trial = breaker.allow(HOST)
+    assert trial
+    breaker.release(HOST, stale)
+    assert not breaker.allow(HOST)
+    breaker.release(HOST, trial)
+    assert breaker.allow(HOST)
+
+
+def test_release_keeps_recorded_failure():
+    breaker = HostCircuitBreaker(threshold=2, reset_timeout=60)
+    breaker.record_failure(HOST)
+    token = breaker.allow(HOST)
+    assert token
+    breaker.record_failure(HOST)
+    breaker.release(HOST, token)
+    assert not breaker.allow(HOST)
+
+
+def test_probe_engine_releases_trial_on_unexpected_error():
+    breaker = HostCircuitBreaker(threshold=1, reset_timeout=0)
+    url = f"http://{HOST}/live.m3u8"
+    breaker.record_failure(HOST)
+
+    async def probe():
+        raise RuntimeError("unexpected")
+
+    async def run():
+        async with ProbeEngine(breaker=breaker) as engine:
+            with pytest.raises(RuntimeError):
+                await engine._run(url, probe)
+
+    asyncio.run(run())
+    assert breaker.allow(HOST)
@@ -0,0 +1,78 @@
+import asyncio
+import socket
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from common import hls
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def serve(routes):
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_get(path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_variant_failure_on_other_host_returns_none():
+    dead = f"http://127.0.0.1:{free_port()}/variant.m3u8"
+
+    async def master(request):
+        return web.Response(text=f"#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\n{dead}\n")
+
+    async def run():
+        runner, base = await serve({'/master.m3u8': master})
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await hls.probe_stream(session, f"{base}/master.m3u8", budget=2)
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(run()) is None
+
+
+def test_playlist_connection_failure_is_raised():
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            await hls.probe_stream(session, f"http://127.0.0.1:{free_port()}/live.m3u8", budget=2)
+
+    with pytest.raises(aiohttp.ClientConnectionError):
+        asyncio.run(run())
+
+
+
+def test_stalled_segment_stays_within_budget():
+    async def playlist(request):
+        return web.Response(text="#EXTM3U\n#EXTINF:4,\n/seg1.ts\n#EXTINF:4,\n/seg2.ts\n")
+
+    async def seg1(request):
+        return web.Response(body=b'x' * 50000)
+
+    async def seg2(request):
+        await asyncio.sleep(2)
+        return web.Response(body=b'x')
+
+    async def run():
+        runner, base = await serve({'/live.m3u8': playlist, '/seg1.ts': seg1, '/seg2.ts': seg2})
+        try:
+            async with aiohttp.ClientSession() as session:
+                start = asyncio.get_running_loop().time()
+                score = await hls.probe_stream(session, f"{base}/live.m3u8", budget=1)
+                return score, asyncio.get_running_loop().time() - start
+        finally:
+            await runner.cleanup()
+
+    score, elapsed = asyncio.run(run())
+    assert score is not None and score.segments == 1
+    assert elapsed < 2
@@ -0,0 +1,28 @@
+import pytest
+
+from common.config import load_config
+from common.hotel_names import build_hotel_normalizer
+
+
+@pytest.fixture(scope="module")
+def normalizer():
+    return build_hotel_normalizer(load_config())
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("中央5体育", "CCTV5"),
+    ("中央13新闻", "CCTV13"),
+    ("央视1综合", "CCTV1"),
+    ("央视新闻", "CCTV13"),
+    ("中央4中文国际HD", "CCTV4"),
+    ("CCTV-13 新闻", "CCTV13"),
+    ("cctv5+体育赛事", "CCTV5+"),
+    ("CCTV5PLUS", "CCTV5+"),
+    ("CCTV1台", "CCTV1"),
+    ("CCTV4K", "CCTV4K"),
+    ("CCTV 4K 超高清", "CCTV4K"),
+    ("湖南卫视高清", "湖南卫视"),
+    ("苏州生活咨讯", "苏州生活"),
+])
+def test_hotel_channel_names(normalizer, name, expected):
+    assert normalizer.normalize(name) == expected
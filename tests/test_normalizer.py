@@ -0,0 +1,43 @@
+import pytest
+
+import tv
+from common.config import load_config
+from common.normalizer import build_normalizer
+
+
+@pytest.fixture(scope="module")
+def normalizer():
+    return build_normalizer(load_config(), pre_replacements=tv.NAME_PRE_REPLACEMENTS,
+                            extra_replacements=tv.NAME_EXTRA_REPLACEMENTS)
+
+
+# 取自 output/ 中的真实频道名称：包含映射关键词的名称保持原样，标识只在词边界处去掉
+@pytest.mark.parametrize("name, expected", [
+    ("东森超视", "东森超视"),
+    ("东森财经新闻", "东森财经新闻"),
+    ("中央大道与新港三号路交口", "中央大道与新港三号路交口"),
+    ("|FR|France 3 Régions [Pays-de-la-Loire]", "|FR|France 3 Régions [PaysdelaLoire]"),
+    ("hustlerhd", "hustlerhd"),
+    ("TravelHD", "TravelHD"),
+    ("beIN Sports Max 1 FullHD", "beIN Sports Max 1 FullHD"),
+    ("[美国]7News Boston (WHDH) (540p)", "[美国]7News Boston (WHDH) (540p)"),
+    ("13 Max HD", "13 Max"),
+    ("3 Sport HD EE", "3 Sport  EE"),
+    ("CCTV-10科教", "CCTV10"),
+    ("CCTV-1 综合", "CCTV1 综合"),
+    ("東森新聞", "东森新闻"),
+    ("澳视澳门", "澳视资讯"),
+])
+def test_real_channel_names(normalizer, name, expected):
+    assert normalizer.normalize(name) == expected
+
+
+@pytest.mark.parametrize("name", ["TVBS亚洲", "MSDN", "SDTV", "凤凰卫视中文台", "CCTV4K"])
+def test_keywords_inside_names_are_kept(normalizer, name):
+    assert normalizer.normalize(name) == name
+
+
+def test_multi_character_rules_map_whole_names(normalizer):
+    assert normalizer.normalize("东森") == "东森新闻"
+    assert normalizer.normalize("TVBS") == "TVBS新闻"
+    assert normalizer.normalize("中央") == "CCTV"
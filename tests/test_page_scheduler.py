@@ -0,0 +1,50 @@
+import asyncio
+
+import tvbox_search
+from tvbox_search import PageScheduler
+
+
+def run_workers(monkeypatch, scheduler, workers, search):
+    async def fake_process(items, *args):
+        return 1
+
+    monkeypatch.setattr(tvbox_search, "search_github", search)
+    monkeypatch.setattr(tvbox_search, "process_items", fake_process)
+    unfinished_on_exit = []
+
+    async def worker():
+        await tvbox_search.search_worker(scheduler, None, None, None, set(), {}, set(), set(), set(), {}, {})
+        unfinished_on_exit.append(set(scheduler.queries) - scheduler.finished)
+
+    async def main():
+        await asyncio.wait_for(asyncio.gather(*(worker() for _ in range(workers))), timeout=5)
+
+    asyncio.run(main())
+    return unfinished_on_exit
+
+
+def test_workers_wait_for_in_flight_pages(monkeypatch):
+    # 查询数少于 worker 数：多余的 worker 等待在搜索中的页返回，所有查询结束后才退出
+    searched = []
+
+    async def search(session, limiter, query, page=1):
+        searched.append((query, page))
+        await asyncio.sleep(0.01)
+        return [{}], 300
+
+    scheduler = PageScheduler(["a", "b"], {}, budget=100)
+    unfinished_on_exit = run_workers(monkeypatch, scheduler, 4, search)
+    assert unfinished_on_exit == [set()] * 4
+    assert sorted(searched) == [(q, p) for q in ("a", "b") for p in (1, 2, 3)]
+    assert not scheduler.in_flight
+
+
+def test_search_error_does_not_strand_waiting_workers(monkeypatch):
+    async def search(session, limiter, query, page=1):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    scheduler = PageScheduler(["a"], {}, budget=10)
+    unfinished_on_exit = run_workers(monkeypatch, scheduler, 3, search)
+    assert unfinished_on_exit == [set()] * 3
+    assert not scheduler.in_flight
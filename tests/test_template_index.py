@@ -0,0 +1,33 @@
+from common.template_index import TemplateIndex
+from tv import PREFERRED_CATEGORIES, write_iptv_list
+
+TEMPLATE_FILE = "config/template.txt"
+
+
+def test_channel_in_several_templates_gets_every_category():
+    index = TemplateIndex()
+    index.add("央视频道", "CCTV5")
+    index.add("体育", "CCTV5")
+    index.add("体育", "CCTV5")
+    assert index.classify("CCTV5") == [("央视频道", "CCTV5"), ("体育", "CCTV5")]
+    assert index.classify("CCTV5体育") == [("央视频道", "CCTV5"), ("体育", "CCTV5")]
+    assert index.classify("CCTV5+") is None
+
+
+def test_block_file_categories_keep_file_order():
+    index = TemplateIndex()
+    index.add_block_file(TEMPLATE_FILE)
+    assert index.block_categories[:2] == ["中央台", "地方卫视"]
+    assert set(index.block_categories) == set(index.categories)
+
+
+def test_iptv_list_follows_template_order(tmp_path):
+    index = TemplateIndex()
+    index.add_block_file(TEMPLATE_FILE)
+    matched = {category: [] for category in reversed(index.categories)}
+    matched["央视频道"] = []
+    path = tmp_path / "iptv_list.txt"
+    write_iptv_list(matched, index.block_categories, str(path))
+    genres = [line.split(",")[0] for line in path.read_text(encoding="utf-8").splitlines()
+              if line.endswith(",#genre#") and not line.startswith("更新时间")]
+    assert genres == [PREFERRED_CATEGORIES[0]] + index.block_categories
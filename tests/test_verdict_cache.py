@@ -0,0 +1,44 @@
+import time
+
+from common.verdict_cache import VerdictCache
+
+URL = "http://example.com/live.m3u8"
+
+
+def open_cache(tmp_path, method, share_from=(), failure_ttl=None):
+    return VerdictCache(str(tmp_path / "verdicts.sqlite"), ttl=86400, method=method,
+                        share_from=share_from, failure_ttl=failure_ttl)
+
+
+def test_verdicts_are_kept_per_method(tmp_path):
+    head = open_cache(tmp_path, "head")
+    head.put(URL, False, 10)
+    head.close()
+    get = open_cache(tmp_path, "get", share_from=("head",))
+    assert get.get(URL) is None
+    get.put(URL, True, 20)
+    assert get.get(URL) == (True, 20)
+    get.close()
+    head = open_cache(tmp_path, "head")
+    assert head.get(URL) == (False, 10)
+    head.close()
+
+
+def test_only_positive_verdicts_are_shared(tmp_path):
+    head = open_cache(tmp_path, "head")
+    head.put(URL, True, 10)
+    head.close()
+    get = open_cache(tmp_path, "get", share_from=("head",))
+    assert get.get(URL) == (True, 10)
+    get.close()
+
+
+def test_transient_failures_expire_sooner(tmp_path):
+    cache = open_cache(tmp_path, "get", failure_ttl=0.05)
+    cache.put(URL, False, 10, transient=True)
+    cache.put("http://example.com/other.m3u8", False, 10)
+    assert cache.get(URL) == (False, 10)
+    time.sleep(0.1)
+    assert cache.get(URL) is None
+    assert cache.get("http://example.com/other.m3u8") == (False, 10)
+    cache.close()
@@ -1,22 +1,63 @@
+import asyncio
+import hashlib
+import urllib.error
 import urllib.request
 from urllib.parse import urlparse
 import os
 import re
-import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import subprocess
 import socket
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from tqdm import tqdm
 import logging
 
+from common import hls
+from common.circuit_breaker import HostCircuitBreaker
+from common.config import load_config
+from common.dns_cache import DnsCache
+from common.normalizer import build_normalizer
+from common.playlist_parser import MAX_SOURCE_BYTES, iter_lines, iter_playlist, read_chunks
+from common.probe import CONNECTION_FAILED, ProbeEngine
+from common.source_cache import SourceCache
+from common.template_index import TemplateIndex
+from common.verdict_cache import VerdictCache
+
 # 配置日志记录
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # 配置 tqdm 进度条的最小更新间隔
 TQDM_MIN_INTERVAL = 2.5
 
+# 频道探测配置：全局并发数、单个主机并发数、单个链接超时（秒）
+PROBE_CONCURRENCY = 200
+PROBE_PER_HOST = 8
+PROBE_TIMEOUT = 6
+
+# 主机熔断：同一主机连续连接失败的次数达到阈值后，其余链接直接判为失败，熔断若干秒后再试探
+BREAKER_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 60
+
+# 开启 config.yaml 的 hls_probe 后，探测结论写入单独的缓存文件，与普通探测互不干扰
+HLS_VERDICT_FILE = 'probe_verdicts_hls.sqlite'
+
+# 合并 iptv_list.txt 时优先排列的分类（频道模板目录中的文件名）；
+# 其后按 config/template.txt 中的分类顺序排列，其余分类按名称排序
+PREFERRED_CATEGORIES = ["央视频道", "卫视频道", "湖南频道", "港台频道"]
+
+# 设置环境变量 TV_DEBUG_DUMP=1 时输出 iptv.txt、iptv_speed.txt 等中间结果
+DEBUG_DUMP = os.environ.get('TV_DEBUG_DUMP') == '1'
+
+# 分块格式的频道模板文件（分类名 + 频道名，空行分隔），与“频道模板”目录中的模板一起使用
+TEMPLATE_FILE = 'config/template.txt'
+
+# 源缓存中 tv.py 解析结果的类别名
+SOURCE_CACHE_KIND = 'tv'
+
+# 在 config.yaml 的 channel_name_replacements 之外的频道名称规则：先去掉连字符，再补充 20M 标识
+NAME_PRE_REPLACEMENTS = {"-": ""}
+NAME_EXTRA_REPLACEMENTS = {"20M": ""}
+
 
 # 读取文本方法
 def read_txt_to_array(file_name):
@@ -32,55 +73,6 @@ def read_txt_to_array(file_name):
         print(f"读取文件时发生错误: {e}")
         return []
 
-# 读取并解析同义词文件
-def load_synonyms(file_name="config/channel_synonyms.json"):
-    synonyms = {}
-    try:
-        with open(file_name, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # 创建一个反向查找字典，以便快速匹配
-            for key, values in data.items():
-                for value in values:
-                    synonyms[value.lower()] = key
-    except FileNotFoundError:
-        print(f"同义词文件 '{file_name}' 未找到，将不使用频道名称标准化功能。")
-    except json.JSONDecodeError:
-        print(f"同义词文件 '{file_name}' 格式错误，请检查 JSON 语法。")
-    return synonyms
-
-
-# 准备支持 m3u 格式
-def get_url_file_extension(url):
-    # 解析 URL
-    parsed_url = urlparse(url)
-    # 获取路径部分
-    path = parsed_url.path
-    # 提取文件扩展名
-    extension = os.path.splitext(path)[1]
-    return extension
-
-
-def convert_m3u_to_txt(m3u_content):
-    # 分行处理
-    lines = m3u_content.split('\n')
-    txt_lines = []
-    # 临时变量用于存储频道名称
-    channel_name = ""
-    for line in lines:
-        # 过滤掉 #EXTM3U 开头的行
-        if line.startswith("#EXTM3U"):
-            continue
-        # 处理 #EXTINF 开头的行
-        if line.startswith("#EXTINF"):
-            # 获取频道名称（假设频道名称在引号后）
-            channel_name = line.split(',')[-1].strip()
-        # 处理 URL 行
-        elif line.startswith("http") or line.startswith("rtmp") or line.startswith("p3p"):
-            txt_lines.append(f"{channel_name},{line.strip()}")
-    # 将结果合并成一个字符串，以换行符分隔
-    return '\n'.join(txt_lines)
-
-
 # 处理带 $ 的 URL，把 $ 之后的内容都去掉（包括 $ 也去掉）
 def clean_url(url):
     last_dollar_index = url.rfind('$')  # 安全起见找最后一个 $ 处理
@@ -89,54 +81,66 @@ def clean_url(url):
     return url
 
 
-# 处理所有 URL
-def process_url(url, timeout=10):
+# 把一条播放列表记录拆分成 (频道名, 频道地址)
+def split_channel_record(channel_name, channel_address):
+    # 处理带 # 号源 = 予加速源
+    if "#" not in channel_address:
+        yield channel_name, clean_url(channel_address)  # 如果没有井号，则照常按照每行规则进行分发
+    else:
+        # 如果有 “#” 号，则根据 “#” 号分隔
+        for channel_url in channel_address.split('#'):
+            yield channel_name, clean_url(channel_url)
+
+
+# 处理所有 URL：边下载边解析，源未变化（304）时直接使用缓存的解析结果
+def process_url(url, timeout=10, sources=None):
+    entry = sources.lookup(SOURCE_CACHE_KIND, url) if sources is not None else None
     try:
-        # 打开 URL 并读取内容
-        start_time = time.time()
-        with urllib.request.urlopen(url, timeout=timeout) as response:
-            # 以二进制方式读取数据
-            data = response.read()
-            # 将二进制数据解码为字符串
-            text = data.decode('utf-8')
-
-            # 处理 m3u 和 m3u8，提取 channel_name 和 channel_address
-            if get_url_file_extension(url) == ".m3u" or get_url_file_extension(url) == ".m3u8":
-                text = convert_m3u_to_txt(text)
-
-            # 逐行处理内容
-            lines = text.split('\n')
-            channel_count = 0  # 初始化频道计数器
-            for line in lines:
-                if "#genre#" not in line and "," in line and "://" in line:
-                    # 拆分成频道名和 URL 部分
-                    parts = line.split(',')
-                    channel_name = parts[0]  # 获取频道名称
-                    channel_address = parts[1]  # 获取频道地址
-                    # 处理带 # 号源 = 予加速源
-                    if "#" not in channel_address:
-                        yield channel_name, clean_url(channel_address)  # 如果没有井号，则照常按照每行规则进行分发
-                    else:
-                        # 如果有 “#” 号，则根据 “#” 号分隔
-                        url_list = channel_address.split('#')
-                        for channel_url in url_list:
-                            yield channel_name, clean_url(channel_url)
-                    channel_count += 1  # 每处理一个频道，计数器加一
-
-            print(f"正在读取URL: {url}")
-            print(f"获取到频道列表: {channel_count} 条")  # 打印频道数量
+        request = urllib.request.Request(url, headers=SourceCache.conditional_headers(entry))
+        try:
+            response = urllib.request.urlopen(request, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and entry is not None:
+                sources.touch(SOURCE_CACHE_KIND, url)
+                print(f"源未变化，使用缓存: {url}")
+                yield from entry.records
+                return
+            raise
+
+        records = []
+        hasher = hashlib.sha256()
+        with response:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            lines = iter_lines(read_chunks(response), MAX_SOURCE_BYTES, hasher, url)
+            for channel_name, _, channel_address in iter_playlist(lines):
+                for record in split_channel_record(channel_name, channel_address):
+                    records.append(record)
+                    yield record
+
+        if sources is not None:
+            if entry is not None and entry.content_hash == hasher.hexdigest():
+                sources.touch(SOURCE_CACHE_KIND, url, etag, last_modified)
+            else:
+                sources.store(SOURCE_CACHE_KIND, url, etag, last_modified, hasher.hexdigest(), records)
+
+        print(f"正在读取URL: {url}")
+        print(f"获取到频道列表: {len(records)} 条")  # 打印频道数量
 
     except Exception as e:
         print(f"处理 URL 时发生错误：{e}")
         return []
 
 
-# 函数用于过滤、标准化和替换频道名称
-def filter_and_modify_sources(corrections):
+# 在线程池中抓取单个源，返回解析出的全部 (频道名, 频道地址)
+def fetch_source(url, timeout, sources):
+    return list(process_url(url, timeout, sources))
+
+
+# 函数用于过滤、标准化和替换频道名称，过滤词与替换规则来自 config.yaml
+def filter_and_modify_sources(corrections, normalizer):
     filtered_corrections = []
-    name_dict = ['购物', '理财', '导视', '指南', '测试', '芒果', 'CGTN', '未知']
     url_dict = ['epg.pw']  # 添加需要排除的域名
-    synonyms = load_synonyms()
 
     for name, url in corrections:
         # 添加类型检查，确保 name 是一个字符串
@@ -144,21 +148,154 @@ def filter_and_modify_sources(corrections):
             print(f"警告：跳过非字符串频道名称: {name}")
             continue
 
-        # 使用同义词进行标准化
-        standardized_name = synonyms.get(name.lower(), name)
-        
         # 增加对url_dict的过滤逻辑
-        if any(word.lower() in standardized_name.lower() for word in name_dict) or any(word in url for word in url_dict):
-            print("过滤频道:" + standardized_name + "," + url)
+        if normalizer.is_filtered(name) or any(word in url for word in url_dict):
+            print("过滤频道:" + normalizer.standardize(name) + "," + url)
         else:
-            # 进行频道名称的替换操作
-            name = standardized_name.replace("FHD", "").replace("HD", "").replace("hd", "").replace("频道", "").replace("高清", "") \
-                .replace("超清", "").replace("20M", "").replace("-", "").replace("4k", "").replace("4K", "") \
-                .replace("4kR", "")
-            filtered_corrections.append((name, url))
+            # 进行频道名称的标准化和替换操作
+            filtered_corrections.append((normalizer.normalize(name), url))
     return filtered_corrections
 
 
+# 以下是检测不同协议URL的函数
+def check_rtmp_url(url, timeout):
+    try:
+        result = subprocess.run(['ffprobe', '-v', 'error', '-rtmp_transport', 'tcp', '-i', url],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, timeout=timeout)
+        return result.returncode == 0
+    except subprocess.TimeoutExpired:
+        print(f"检测超时 {url}")
+    except Exception as e:
+        print(f"检测错误 {url}: {e}")
+    return False
+
+
+def check_rtp_url(url, timeout):
+    try:
+        parsed_url = urlparse(url)
+        host = parsed_url.hostname
+        port = parsed_url.port
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.settimeout(timeout)
+            s.connect((host, port))
+            s.sendto(b'', (host, port))
+            s.recv(1)
+        return True
+    except (socket.timeout, socket.error):
+        return False
+
+
+def check_p3p_url(url, timeout):
+    try:
+        parsed_url = urlparse(url)
+        host = parsed_url.hostname
+        port = parsed_url.port
+        path = parsed_url.path
+
+        with socket.create_connection((host, port), timeout=timeout) as s:
+            request = f"GET {path} P3P/1.0\r\nHost: {host}\r\n\r\n"
+            s.sendall(request.encode())
+            response = s.recv(1024)
+            return b"P3P" in response
+    except Exception as e:
+        print(f"检测错误 {url}: {e}")
+    return False
+
+
+# 检测单个链接：先查探测结论缓存，未命中时 HTTP 链接只发一次请求，其余协议在线程中检测
+# 开启 HLS 探测时 m3u8 链接连续下载几个片段，可持续播放比例不足 1 的链接按比例放大耗时，排序靠后
+async def check_url(engine, verdicts, url, channel_name, timeout=PROBE_TIMEOUT, hls_probe=None):
+    if verdicts is not None:
+        cached = verdicts.get(url)
+        if cached is not None:
+            success, elapsed_time = cached
+            return elapsed_time, success
+    try:
+        if hls_probe and url.startswith("http") and urlparse(url).path.endswith('.m3u8'):
+            elapsed_time, score = await engine.probe_hls(url, hls_probe['segments'], hls_probe['budget'])
+            if score is CONNECTION_FAILED:
+                success = CONNECTION_FAILED
+            else:
+                success = score is not None and score.sustain >= hls_probe['min_sustain']
+            if score:
+                elapsed_time = score.latency_ms / max(min(score.sustain, 1.0), 0.01)
+        elif url.startswith("http"):
+            elapsed_time, success = await engine.probe_http(url)
+        elif url.startswith("p3p"):
+            elapsed_time, success = await engine.probe_blocking(url, check_p3p_url, timeout)
+        elif url.startswith("rtmp"):
+            elapsed_time, success = await engine.probe_blocking(url, check_rtmp_url, timeout)
+        elif url.startswith("rtp"):
+            elapsed_time, success = await engine.probe_blocking(url, check_rtp_url, timeout)
+        else:
+            return None, False
+    except Exception as e:
+        print(f"检测错误 {channel_name}: {url}: {e}")
+        return None, False
+    # 主机被熔断时没有实际探测（耗时为 None），不写入缓存；连接失败和超时只短期缓存
+    if verdicts is not None and elapsed_time is not None:
+        verdicts.put(url, success, elapsed_time, transient=success is CONNECTION_FAILED)
+    return elapsed_time, bool(success)
+
+
+# 检测单条 (频道名, 频道地址) 记录
+async def process_line(engine, verdicts, channel, hls_probe=None):
+    name, url = channel
+    if "://" not in url:
+        return None, None
+    elapsed_time, is_valid = await check_url(engine, verdicts, url.strip(), name, hls_probe=hls_probe)
+    if is_valid:
+        return elapsed_time, (name, url)
+    return None, None
+
+
+async def process_urls_async(channels, verdicts=None, hls_probe=None):
+    results = []
+    # 批量预解析所有主机名，无法解析的链接直接丢弃，不占用探测名额
+    dns = DnsCache()
+    host_count = await dns.prefetch(url.strip() for _, url in channels)
+    resolvable_channels = [channel for channel in channels if dns.is_resolvable(channel[1].strip())]
+    print(f"预解析 {host_count} 个主机，丢弃 {len(channels) - len(resolvable_channels)} 条无法解析的链接")
+    channels = resolvable_channels
+
+    breaker = HostCircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET_TIMEOUT)
+    async with ProbeEngine(concurrency=PROBE_CONCURRENCY, per_host=PROBE_PER_HOST, timeout=PROBE_TIMEOUT, breaker=breaker, dns=dns) as engine:
+        tasks = [process_line(engine, verdicts, channel, hls_probe) for channel in channels]
+        # 使用 tqdm 包装 as_completed
+        for future in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="检测频道", mininterval=TQDM_MIN_INTERVAL):
+            elapsed_time, result = await future
+            if elapsed_time is not None:
+                results.append((elapsed_time, result))
+
+    # 按照检测后的毫秒数升序排列
+    results.sort()
+    return results
+
+
+# 读取 config.yaml 的 hls_probe 配置，未开启时返回 None
+def load_hls_probe_options(config):
+    options = config.get('hls_probe', {})
+    if not options.get('enabled', False):
+        return None
+    return {
+        'segments': options.get('segments', hls.DEFAULT_SEGMENTS),
+        'budget': options.get('budget', hls.DEFAULT_BUDGET),
+        'min_sustain': options.get('min_sustain', 1.0),
+    }
+
+
+# 调试用：设置环境变量 TV_DEBUG_DUMP=1 时把中间结果写到根目录，正常运行不落盘
+def dump_lines(file_name, lines):
+    if not DEBUG_DUMP:
+        return
+    with open(os.path.join(os.getcwd(), file_name), 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + '\n')
+    print(f"调试文件已写入: {file_name}")
+
+
 # 删除目录内所有 .txt 文件
 def clear_txt_files(directory):
     for filename in os.listdir(directory):
@@ -172,299 +309,139 @@ def clear_txt_files(directory):
 
 # 主函数
 def main():
+    config = load_config()
+
     # 读取 URLs
     urls_file_path = os.path.join(os.getcwd(), 'config/urls.txt')
     urls = read_txt_to_array(urls_file_path)
 
+    # 并发抓取所有源，结果仍按 urls.txt 的顺序汇总
+    network = config.get('network', {})
+    fetch_workers = network.get('url_fetch_workers', 10)
+    request_timeout = network.get('request_timeout', 10)
+    source_channels = [[] for _ in urls]
+    sources = SourceCache.from_config(config)
+    try:
+        with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+            future_to_index = {
+                executor.submit(fetch_source, url, request_timeout, sources): index
+                for index, url in enumerate(urls)
+            }
+            for future in tqdm(as_completed(future_to_index), total=len(urls), desc="处理URL", mininterval=TQDM_MIN_INTERVAL):
+                source_channels[future_to_index[future]] = future.result()
+    finally:
+        if sources is not None:
+            sources.close()
+
     # 处理过滤和替换频道名称
     all_channels = []
-    for url in tqdm(urls, desc="处理URL", mininterval=TQDM_MIN_INTERVAL):
-        for channel_name, channel_url in process_url(url):
+    for channels in source_channels:
+        for channel_name, channel_url in channels:
             all_channels.append((channel_name, channel_url))
 
     # 过滤和修改频道名称
-    filtered_channels = filter_and_modify_sources(all_channels)
+    normalizer = build_normalizer(config, pre_replacements=NAME_PRE_REPLACEMENTS, extra_replacements=NAME_EXTRA_REPLACEMENTS)
+    filtered_channels = filter_and_modify_sources(all_channels, normalizer)
 
     # 去重
     unique_channels = list(set(filtered_channels))
 
-    unique_channels_str = [f"{name},{url}" for name, url in unique_channels]
-
-    # 写入 iptv.txt 文件
-    iptv_file_path = os.path.join(os.getcwd(), 'iptv.txt')
-    with open(iptv_file_path, 'w', encoding='utf-8') as f:
-        for line in unique_channels_str:
-            f.write(line + '\n')
-
-    # 打印出本次写入iptv.txt文件的总频道列表数量
-    with open(iptv_file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-        total_channels = len(lines)
-        print(f"\n所有频道已保存到文件: {iptv_file_path}，共采集到频道数量: {total_channels} 条\n")
-
-
-    # ----- 新增快速检测函数 -----
-    def check_url_quick(url, timeout=3):
-        try:
-            if url.startswith("http"):
-                response = urllib.request.urlopen(url, timeout=timeout)
-                if response.status == 200:
-                    return True
-        except Exception:
-            pass  # 忽略错误，直接返回 False
-        return False
-    # ----------------------------
-
-    def check_url(url, channel_name, timeout=6):
-        start_time = time.time()
-        elapsed_time = None
-        success = False
-
-        try:
-            if url.startswith("http"):
-                response = urllib.request.urlopen(url, timeout=timeout)
-                if response.status == 200:
-                    success = True
-            elif url.startswith("p3p"):
-                success = check_p3p_url(url, timeout)
-            elif url.startswith("rtmp"):
-                success = check_rtmp_url(url, timeout)
-            elif url.startswith("rtp"):
-                success = check_rtp_url(url, timeout)
-            else:
-                return None, False
-
-            elapsed_time = (time.time() - start_time) * 1000  # 转换为毫秒
-        except Exception as e:
-            print(f"检测错误 {channel_name}: {url}: {e}")
+    dump_lines('iptv.txt', (f"{name},{url}" for name, url in unique_channels))
+    print(f"\n共采集到频道数量: {len(unique_channels)} 条\n")
 
-        return elapsed_time, success
-
-    # 以下是检测不同协议URL的函数
-    def check_rtmp_url(url, timeout):
-        try:
-            result = subprocess.run(['ffprobe', '-v', 'error', '-rtmp_transport', 'tcp', '-i', url],
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE, timeout=timeout)
-            return result.returncode == 0
-        except subprocess.TimeoutExpired:
-            print(f"检测超时 {url}")
-        except Exception as e:
-            print(f"检测错误 {url}: {e}")
-        return False
-
-    def check_rtp_url(url, timeout):
-        try:
-            parsed_url = urlparse(url)
-            host = parsed_url.hostname
-            port = parsed_url.port
-
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                s.settimeout(timeout)
-                s.connect((host, port))
-                s.sendto(b'', (host, port))
-                s.recv(1)
-            return True
-        except (socket.timeout, socket.error):
-            return False
-
-    def check_p3p_url(url, timeout):
-        try:
-            parsed_url = urlparse(url)
-            host = parsed_url.hostname
-            port = parsed_url.port
-            path = parsed_url.path
-
-            with socket.create_connection((host, port), timeout=timeout) as s:
-                request = f"GET {path} P3P/1.0\r\nHost: {host}\r\n\r\n"
-                s.sendall(request.encode())
-                response = s.recv(1024)
-                return b"P3P" in response
-        except Exception as e:
-            print(f"检测错误 {url}: {e}")
-        return False
-
-    # 去掉文本'$'后面的内容
-    def process_line(line):
-        if "://" not in line:
-            return None, None
-        line = line.split('$')[0]
-        parts = line.split(',')
-        if len(parts) == 2:
-            name, url = parts
-            # ----- 第一步：快速检查 -----
-            if url.startswith("http") and not check_url_quick(url.strip()):
-                return None, None  # 快速检查失败，直接跳过
-            # ----- 第二步：详细检测 -----
-            elapsed_time, is_valid = check_url(url.strip(), name)
-            if is_valid:
-                return elapsed_time, f"{name},{url}"
-        return None, None
-
-    def process_urls_multithreaded(lines, max_workers=200):
-        results = []
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(process_line, line): line for line in lines}
-            # 使用 tqdm 包装 as_completed
-            for future in tqdm(as_completed(futures), total=len(lines), desc="检测频道", mininterval=TQDM_MIN_INTERVAL):
-                elapsed_time, result = future.result()
-                if elapsed_time is not None:
-                    results.append((elapsed_time, result))
-
-        # 按照检测后的毫秒数升序排列
-        results.sort()
-        return results
-
-    # 使用多线程检测URL
-    results = process_urls_multithreaded(unique_channels_str)
-
-    # 写入文件
-    def write_list(file_path, data_list):
-        with open(file_path, 'w', encoding='utf-8') as file:
-            for item in data_list:
-                elapsed_time, result = item
-                channel_name, channel_url = result.split(',')
-                file.write(f"{channel_name},{channel_url}\n")
-
-    # 写入结果到文件
-    iptv_speed_file_path = os.path.join(os.getcwd(), 'iptv_speed.txt')
-    write_list(iptv_speed_file_path, results)
+    # 使用异步探测引擎检测URL，仍在有效期内的探测结论直接复用；HLS 探测的结论单独缓存，
+    # 普通探测（GET 看状态码）还可复用 check_and_clean.py 的“可用”结论（HEAD 且为视频流类型）
+    hls_probe = load_hls_probe_options(config)
+    if hls_probe:
+        verdicts = VerdictCache.from_config(config, HLS_VERDICT_FILE, method='hls')
+    else:
+        verdicts = VerdictCache.from_config(config, method='get', share_from=('head',))
+    try:
+        results = asyncio.run(process_urls_async(unique_channels, verdicts, hls_probe))
+    finally:
+        if verdicts is not None:
+            verdicts.close()
 
     # 打印结果
-    for elapsed_time, result in results:
-        channel_name, channel_url = result.split(',')
+    for elapsed_time, (channel_name, channel_url) in results:
         print(f"检测成功  {channel_name},{channel_url}  响应时间 ：{elapsed_time:.0f} 毫秒")
+    dump_lines('iptv_speed.txt', (f"{name},{url}" for _, (name, url) in results))
 
-    # 将临时文件的保存路径设置为根目录
-    local_channels_directory = os.getcwd()
-    
     # 遍历频道模板目录下的所有文件
     template_directory = os.path.join(os.getcwd(), '频道模板')
     if not os.path.exists(template_directory):
         os.makedirs(template_directory)
         print(f"目录 '{template_directory}' 已创建。")
-    template_files = [f for f in os.listdir(template_directory) if f.endswith('.txt')]
-
-    # 读取 iptv_speed.txt 文件中的频道列表
-    iptv_speed_channels = read_txt_to_array(iptv_speed_file_path)
-    
-    # 获取所有模板频道名，用于后续筛选未分类频道
-    all_template_channel_names = set()
-
-    # 对于每个模板文件，进行比对并写入结果
-    for template_file in template_files:
-        template_channels = read_txt_to_array(os.path.join(template_directory, template_file))
-        template_name = os.path.splitext(template_file)[0]
-        
-        # 将模板中的频道名添加到总集合中
-        all_template_channel_names.update(template_channels)
-
-        # 筛选出匹配的频道
-        matched_channels = [channel for channel in iptv_speed_channels if
-                            channel.split(',')[0] in template_channels]
-
-        # 对 CCTV 频道进行排序
-        def channel_key(channel_name):
-            match = re.search(r'\d+', channel_name)
-            if match:
-                return int(match.group())
-            else:
-                return float('inf')  # 返回一个无穷大的数字作为关键字
-
-        matched_channels.sort(key=lambda x: channel_key(x.split(',')[0]))
-        matched_channels.sort(key=lambda x: channel_key(x[0]))
 
-        # 写入对应地区命名的 _iptv.txt 文件中，保存在根目录
-        output_file_path = os.path.join(local_channels_directory, f"{template_name}_iptv.txt")
-        with open(output_file_path, 'w', encoding='utf-8') as f:
-            # 写入标题行
-            f.write(f"{template_name},#genre#\n")
-            for channel in matched_channels:
-                f.write(channel + '\n')
-        print(f"频道列表已写入: {template_name}_iptv.txt")
+    # 一次性建立模板索引（频道模板目录 + config/template.txt），每个频道只查询一次完成分类
+    template_index = TemplateIndex()
+    template_index.add_directory(template_directory)
+    if os.path.exists(TEMPLATE_FILE):
+        template_index.add_block_file(TEMPLATE_FILE)
+
+    matched_by_category = {category: [] for category in template_index.categories}
+    uncategorized_channels = []
+    for _, (channel_name, channel_url) in results:
+        matches = template_index.classify(channel_name)
+        if matches is None:
+            uncategorized_channels.append((channel_name, channel_url))
+            continue
+        # 同一频道出现在多个模板中时写入每个分类；模糊匹配到的变体统一使用模板中的频道名
+        for category, template_channel_name in matches:
+            matched_by_category[category].append((template_channel_name, channel_url))
+
+    # 对 CCTV 频道进行排序
+    def channel_key(channel_name):
+        match = re.search(r'\d+', channel_name)
+        if match:
+            return int(match.group())
+        else:
+            return float('inf')  # 返回一个无穷大的数字作为关键字
 
-    # 筛选出未分类的频道并写入新文件
-    uncategorized_channels = [channel for channel in iptv_speed_channels if
-                              channel.split(',')[0] not in all_template_channel_names]
+    for template_name, matched_channels in matched_by_category.items():
+        matched_channels.sort(key=lambda x: channel_key(x[0]))
+        dump_lines(f"{template_name}_iptv.txt", [f"{template_name},#genre#"] + [f"{name},{url}" for name, url in matched_channels])
 
+    # 未分类的频道写入新文件，直接保存在根目录
     if uncategorized_channels:
-        # 修改保存路径，直接保存在根目录
         uncategorized_file_path = os.path.join(os.getcwd(), 'uncategorized_iptv.txt')
         with open(uncategorized_file_path, 'w', encoding='utf-8') as f:
             f.write("未分类频道,#genre#\n")
-            for channel in uncategorized_channels:
-                f.write(channel + '\n')
-        print(f"未分类频道列表已写入: uncategorized_iptv.txt")
-
-
-    # 合并所有 _iptv.txt 文件
-    def merge_iptv_files():
-        merged_content = ""
-        # 获取所有 _iptv.txt 文件的路径，现在它们在根目录
-        iptv_files = [f for f in os.listdir(local_channels_directory) if f.endswith('_iptv.txt')]
-        # 确定央视频道和卫视频道的文件名
-        central_channel_file = "央视频道_iptv.txt"
-        satellite_channel_file = "卫视频道_iptv.txt"
-        hunan_channel_file = "湖南频道_iptv.txt"
-        hk_taiwan_channel_file = "港台频道_iptv.txt"
-        uncategorized_file = "uncategorized_iptv.txt"
-        # 创建一个有序的文件列表
-        ordered_files = [central_channel_file, satellite_channel_file, hunan_channel_file, hk_taiwan_channel_file]
-
-        # 按照指定的顺序合并文件内容
-        for file_name in ordered_files:
-            if file_name in iptv_files:
-                file_path = os.path.join(local_channels_directory, file_name)
-                with open(file_path, "r", encoding="utf-8") as file:
-                    merged_content += file.read() + "\n"
-                iptv_files.remove(file_name)
-
-        # 添加剩余的频道
-        for file_name in sorted(iptv_files):
-            # 排除未分类频道文件
-            if file_name != uncategorized_file:
-                file_path = os.path.join(local_channels_directory, file_name)
-                with open(file_path, "r", encoding="utf-8") as file:
-                    merged_content += file.read() + "\n"
-        # 获取当前时间
-        now = datetime.now()
-        update_time_line = f"更新时间,#genre#\n{now.strftime('%Y-%m-%d')},url\n{now.strftime('%H:%M:%S')},url\n"
-
-        # 将合并后的内容写入 iptv_list.txt 文件
-        iptv_list_file_path = "iptv_list.txt"
-        with open(iptv_list_file_path, "w", encoding="utf-8") as iptv_list_file:
-            iptv_list_file.write(update_time_line)
-            # 对每个频道名称的频道列表进行分组
-            channels_grouped = {}
-            for line in merged_content.split('\n'):
-                if line:
-                    parts = line.split(',')
-                    channel_name = parts[0]
-                    channel_url = parts[1]
-                    if channel_name not in channels_grouped:
-                        channels_grouped[channel_name] = []
-                    channels_grouped[channel_name].append(line)
-
-            # 只保留每个分组的前200个频道
-            for channel_name in channels_grouped:
-                channels_grouped[channel_name] = channels_grouped[channel_name][:200]
-
-            # 将处理后的频道列表写入文件
-            for channel_name in channels_grouped:
-                for channel_line in channels_grouped[channel_name]:
-                    iptv_list_file.write(channel_line + '\n')
-
-        # 删除临时文件 iptv.txt 和 iptv_speed.txt
-        try:
-            os.remove('iptv.txt')
-            os.remove('iptv_speed.txt')
-            print(f"临时文件 iptv.txt 和 iptv_speed.txt 已删除。")
-        except OSError as e:
-            print(f"删除临时文件时发生错误: {e}")
-
-        print(f"\n所有地区频道列表文件合并完成，文件保存为：{iptv_list_file_path}")
-    # 调用合并文件的函数
-    merge_iptv_files()
+            for channel_name, channel_url in uncategorized_channels:
+                f.write(f"{channel_name},{channel_url}\n")
+        print("未分类频道列表已写入: uncategorized_iptv.txt")
+
+    write_iptv_list(matched_by_category, template_index.block_categories)
+
+
+# 按分类顺序合并频道，写入最终的 iptv_list.txt
+def write_iptv_list(matched_by_category, block_categories=(), iptv_list_file_path="iptv_list.txt"):
+    # 频道模板目录中的央视、卫视、湖南、港台频道优先，其次按 template.txt 的分类顺序，其余分类按名称排序
+    ordered_categories = []
+    for category in list(PREFERRED_CATEGORIES) + list(block_categories):
+        if category in matched_by_category and category not in ordered_categories:
+            ordered_categories.append(category)
+    ordered_categories += sorted(category for category in matched_by_category if category not in ordered_categories)
+
+    # 对每个频道名称的频道列表进行分组，分类标题行也按同样方式分组
+    channels_grouped = {}
+    for category in ordered_categories:
+        channels_grouped.setdefault(category, []).append(f"{category},#genre#")
+        for channel_name, channel_url in matched_by_category[category]:
+            channels_grouped.setdefault(channel_name, []).append(f"{channel_name},{channel_url}")
+
+    # 获取当前时间
+    now = datetime.now()
+    update_time_line = f"更新时间,#genre#\n{now.strftime('%Y-%m-%d')},url\n{now.strftime('%H:%M:%S')},url\n"
+
+    with open(iptv_list_file_path, "w", encoding="utf-8") as iptv_list_file:
+        iptv_list_file.write(update_time_line)
+        # 只保留每个分组的前200个频道
+        for channel_lines in channels_grouped.values():
+            for channel_line in channel_lines[:200]:
+                iptv_list_file.write(channel_line + '\n')
+
+    print(f"\n所有地区频道列表文件合并完成，文件保存为：{iptv_list_file_path}")
 
 
 if __name__ == "__main__":
@@ -7,6 +7,8 @@ import asyncio
 import aiohttp
 from urllib.parse import urlparse
 
+from common.box_store import load_unique_configs
+
 # Configure logging with INFO level
 logging.basicConfig(
     level=logging.INFO,
@@ -88,55 +90,45 @@ async def is_valid_url(url: str, session: aiohttp.ClientSession) -> bool:
         URL_CACHE[url_to_check] = False
         return False
 
-async def process_file(filepath: str, session: aiohttp.ClientSession) -> Tuple[List[Dict[str, Any]], List[str]]:
+async def process_file(filepath: str, data: Any, session: aiohttp.ClientSession) -> Tuple[List[Dict[str, Any]], List[str]]:
     """
-    Read and parse a JSON file, filter sites with valid URLs, and extract sites and spider.
+    Filter sites of an already parsed config with valid URLs, and extract sites and spider.
     """
     sites: List[Dict[str, Any]] = []
     spider: List[str] = [] # Note: spider is expected to be a single string, but use a list for easier merging
 
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-            if not content.strip():
-                logger.warning(f"File '{filepath}' is empty. Skipping.")
-                return sites, spider
+        # Case 1: The file is a complete config with 'sites', 'spider', etc.
+        if isinstance(data, dict) and 'sites' in data:
+            all_sites = data.get('sites', [])
+            all_spider = [data.get('spider', "")]
             
-            data = json.loads(content)
+            # Check each site's validity concurrently
+            tasks = [is_valid_url(site.get('api', ''), session) for site in all_sites]
+            valid_results = await asyncio.gather(*tasks)
+
+            for site, is_valid in zip(all_sites, valid_results):
+                if is_valid:
+                    sites.append(site)
+                else:
+                    logger.debug(f"Excluding invalid site from '{filepath}': {site.get('name', 'Unnamed Site')}")
             
-            # Case 1: The file is a complete config with 'sites', 'spider', etc.
-            if isinstance(data, dict) and 'sites' in data:
-                all_sites = data.get('sites', [])
-                all_spider = [data.get('spider', "")]
-                
-                # Check each site's validity concurrently
-                tasks = [is_valid_url(site.get('api', ''), session) for site in all_sites]
-                valid_results = await asyncio.gather(*tasks)
-
-                for site, is_valid in zip(all_sites, valid_results):
-                    if is_valid:
-                        sites.append(site)
-                    else:
-                        logger.debug(f"Excluding invalid site from '{filepath}': {site.get('name', 'Unnamed Site')}")
-                
-                if all_spider and all_spider[0]:
-                    spider.extend(all_spider)
-
-            # Case 2: The file is a single site object
-            elif isinstance(data, dict) and 'api' in data and 'name' in data:
-                site_url = data.get('api', '')
-                if site_url:
-                    is_valid = await is_valid_url(site_url, session)
-                    if is_valid:
-                        sites.append(data)
-                    else:
-                        logger.debug(f"Excluding invalid single site from '{filepath}': {data.get('name', 'Unnamed Site')}")
-
-            else:
-                logger.warning(f"File '{filepath}' does not contain a valid sites config. Skipping.")
-
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse JSON in file '{filepath}': {e}")
+            if all_spider and all_spider[0]:
+                spider.extend(all_spider)
+
+        # Case 2: The file is a single site object
+        elif isinstance(data, dict) and 'api' in data and 'name' in data:
+            site_url = data.get('api', '')
+            if site_url:
+                is_valid = await is_valid_url(site_url, session)
+                if is_valid:
+                    sites.append(data)
+                else:
+                    logger.debug(f"Excluding invalid single site from '{filepath}': {data.get('name', 'Unnamed Site')}")
+
+        else:
+            logger.warning(f"File '{filepath}' does not contain a valid sites config. Skipping.")
+
     except Exception as e:
         logger.error(f"An error occurred while processing '{filepath}': {e}")
     
@@ -151,7 +143,8 @@ async def merge_files(source_files: List[str], output_file: str):
     spider: List[str] = [] # Used to hold the first found spider URL
 
     async with aiohttp.ClientSession() as session:
-        tasks = [process_file(f, session) for f in source_files]
+        # Files with the same canonical content (ignoring key order and formatting) are checked only once
+        tasks = [process_file(path, data, session) for path, data in load_unique_configs(source_files)]
         results = await asyncio.gather(*tasks)
         
         for result in results:
@@ -1,4 +1,3 @@
-import requests
 import json
 import os
 import sys
@@ -6,11 +5,14 @@ import logging
 import time
 import asyncio
 import aiohttp
+import codecs
 import hashlib
-from typing import Tuple, Set, List, Dict
+import math
+from typing import Tuple, Set, List, Dict, NamedTuple, Optional
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
-import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from common.box_store import canonical_hash, load_index, parse_config, save_config, save_index
 
 # 配置日志记录
 logging.basicConfig(
@@ -20,14 +22,93 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# [其他函数保持不变，如 fetch_url, validate_tvbox_interface, save_valid_file, load_cache, save_cache, generate_dynamic_queries, load_query_stats, save_query_stats, load_existing_content_hashes]
-async def fetch_url(session, url, headers, timeout=10, retries=3):
-    """异步获取 URL 内容，带重试机制"""
+# GitHub 代码搜索 API（/search/code）的限额：认证后也只有每分钟 10 次，实际余量以响应头为准
+SEARCH_RATE_LIMIT = 10
+SEARCH_RATE_WINDOW = 60
+# 原始文件下载：总连接数和同一主机（raw.githubusercontent.com）的连接数上限
+RAW_FETCH_CONCURRENCY = 32
+RAW_FETCH_PER_HOST = 16
+# 单个候选配置最多下载的字节数，超过的文件直接放弃
+MAX_CONFIG_BYTES = 4 * 1024 * 1024
+# 只根据开头这么多字节判断是否值得继续下载
+SNIFF_BYTES = 16 * 1024
+SNIFF_KEYS = (b'"sites"', b'"lives"', b'"spider"')
+FETCH_CHUNK_SIZE = 64 * 1024
+
+# box/ 的哈希清单放在 box/ 之外（合并脚本会读取 box/*.json），由 Actions cache 持久化
+BOX_MANIFEST_FILE = os.path.join("cache", "box_manifest.json")
+# 搜索结果缓存（仓库/路径 → blob sha → 结论），同样由 Actions cache 持久化
+SEARCH_CACHE_FILE = os.path.join("cache", "search_cache.json")
+# 需要计算哈希的文件数达到该值时使用进程池
+HASH_PROCESS_THRESHOLD = 64
+# 查询统计（每个查询各页的新配置产出），同样由 Actions cache 持久化；旧版本放在仓库根目录
+QUERY_STATS_FILE = os.path.join("cache", "query_stats.json")
+LEGACY_QUERY_STATS_FILE = "query_stats.json"
+
+# 翻页调度：每次运行最多调用搜索 API 的次数，由调度器分配给近期产出最高的查询和页
+SEARCH_PAGE_BUDGET = 80
+# GitHub 代码搜索最多返回 1000 条结果，即 10 页
+SEARCH_MAX_PAGES = 10
+# 同时进行的搜索请求数（实际速率仍由令牌桶控制）
+SEARCH_WORKERS = 4
+# 每次运行开始时历史统计乘以该系数，近期的产出权重更高，久未搜索的查询探索奖励随之变大
+STATS_DECAY = 0.8
+# UCB 探索系数
+UCB_EXPLORATION = 0.5
+
+# [其他函数保持不变，如 fetch_config, validate_tvbox_interface, save_valid_file, load_cache, save_cache, generate_dynamic_queries, load_query_stats, save_query_stats, load_existing_content_hashes]
+class RawFile(NamedTuple):
+    content: Optional[str]  # 提前放弃时为 None
+    raw_hash: Optional[str]  # 原始字节的 sha256，下载过程中增量计算
+    rejected: str  # 放弃的原因，完整下载时为空字符串
+
+def sniff_config(head: bytes, complete: bool) -> Optional[bool]:
+    """
+    根据开头的字节粗略判断是否可能是 TVBox 配置：第一个非空白字符必须是 '{'，
+    并且出现 "sites"/"lives"/"spider" 键之一。complete 表示已读满嗅探长度或已到文件末尾，
+    数据还不够判断时返回 None。
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        head = head[len(codecs.BOM_UTF8):]
+    stripped = head.lstrip()
+    if not stripped:
+        return False if complete else None
+    if not stripped.startswith(b'{'):
+        return False
+    if any(key in head for key in SNIFF_KEYS):
+        return True
+    return False if complete else None
+
+async def fetch_config(session, url, headers, timeout=10, retries=3):
+    """
+    流式下载候选配置文件，带重试机制。最多读取 MAX_CONFIG_BYTES 字节，开头的 SNIFF_BYTES 字节
+    不像 TVBox 配置时立即放弃；网络错误重试后仍失败返回 None，下次运行重试。
+    """
     for attempt in range(retries):
         try:
             async with session.get(url, headers=headers, timeout=timeout) as response:
                 response.raise_for_status()
-                return await response.text()
+                if response.content_length and response.content_length > MAX_CONFIG_BYTES:
+                    return RawFile(None, None, f"too large ({response.content_length} bytes)")
+                digest = hashlib.sha256()
+                body = bytearray()
+                candidate = None
+                async for chunk in response.content.iter_chunked(FETCH_CHUNK_SIZE):
+                    digest.update(chunk)
+                    body.extend(chunk)
+                    if len(body) > MAX_CONFIG_BYTES:
+                        return RawFile(None, None, f"too large (over {MAX_CONFIG_BYTES} bytes)")
+                    if candidate is None:
+                        candidate = sniff_config(bytes(body[:SNIFF_BYTES]), len(body) >= SNIFF_BYTES)
+                        if candidate is False:
+                            return RawFile(None, None, "not a TVBox config")
+                if candidate is None and not sniff_config(bytes(body), True):
+                    return RawFile(None, None, "not a TVBox config")
+                try:
+                    content = body.decode('utf-8')
+                except UnicodeDecodeError:
+                    return RawFile(None, None, "not UTF-8")
+                return RawFile(content, digest.hexdigest(), "")
         except Exception as e:
             logger.warning(f"Error fetching {url} (attempt {attempt + 1}/{retries}): {e}")
             if attempt < retries - 1:
@@ -39,58 +120,121 @@ async def fetch_url(session, url, headers, timeout=10, retries=3):
 def validate_tvbox_interface(json_str: str) -> bool:
     """检查 JSON 字符串是否为有效的 TVBox 接口格式，增强验证逻辑"""
     try:
-        data = json.loads(json_str)
-        if not isinstance(data, dict):
-            return False
-        
-        has_sites = 'sites' in data and isinstance(data['sites'], list)
-        has_lives = 'lives' in data and isinstance(data['lives'], list)
-        has_spider = 'spider' in data and isinstance(data['spider'], str) and data['spider'].strip()
-        
-        if not (has_sites or has_lives or has_spider):
-            return False
+        return is_tvbox_config(json.loads(json_str))
+    except json.JSONDecodeError:
+        return False
 
-        if has_sites and any(isinstance(site, dict) and ('api' in site or 'url' in site) for site in data['sites']):
-            return True
-        
-        if has_lives and any(isinstance(live, dict) and 'channels' in live for live in data['lives']):
-            return True
-            
-        if has_spider:
-            return True
-        
+def is_tvbox_config(data) -> bool:
+    """检查已解析的配置是否为有效的 TVBox 接口格式"""
+    if not isinstance(data, dict):
         return False
-    except json.JSONDecodeError:
+
+    has_sites = 'sites' in data and isinstance(data['sites'], list)
+    has_lives = 'lives' in data and isinstance(data['lives'], list)
+    has_spider = 'spider' in data and isinstance(data['spider'], str) and data['spider'].strip()
+
+    if not (has_sites or has_lives or has_spider):
         return False
 
+    if has_sites and any(isinstance(site, dict) and ('api' in site or 'url' in site) for site in data['sites']):
+        return True
+
+    if has_lives and any(isinstance(live, dict) and 'channels' in live for live in data['lives']):
+        return True
+
+    if has_spider:
+        return True
+
+    return False
+
+def hash_file(filepath: str) -> str:
+    """
+    计算单个文件的规范化内容哈希（键排序后序列化再取 SHA256），不是 JSON 时取原始字节的 SHA256；
+    读取失败时返回空字符串（供进程池调用）
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        data = parse_config(raw.decode('utf-8', errors='replace'))
+        return canonical_hash(data) if data is not None else hashlib.sha256(raw).hexdigest()
+    except OSError as e:
+        logger.warning(f"Could not read or hash file {filepath}: {e}")
+        return ''
+
+def load_box_manifest(manifest_file: str = BOX_MANIFEST_FILE) -> Dict[str, dict]:
+    """加载 box/ 的哈希清单：{文件名: {"size": 字节数, "mtime": 修改时间, "canonical_hash": 规范化内容哈希}}"""
+    if os.path.exists(manifest_file):
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Error loading box manifest: {e}")
+    return {}
+
+def save_box_manifest(manifest: Dict[str, dict], manifest_file: str = BOX_MANIFEST_FILE):
+    """保存 box/ 的哈希清单"""
+    try:
+        os.makedirs(os.path.dirname(manifest_file) or '.', exist_ok=True)
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    except Exception as e:
+        logger.error(f"Error saving box manifest: {e}")
+
 def load_existing_content_hashes(directory: str) -> Set[str]:
-    """遍历本地目录，计算并返回所有文件的 SHA256 哈希值"""
-    hashes = set()
+    """
+    返回目录中所有 JSON 文件的规范化内容哈希。
+    文件名、大小和修改时间与清单一致的文件直接使用清单中的哈希，只对新增或变化的文件重新计算；
+    需要计算的文件较多时使用进程池。
+    """
     if not os.path.exists(directory):
-        return hashes
+        return set()
+    manifest = load_box_manifest()
+    # actions/checkout 会把所有文件的修改时间设为检出时间，CI 中只比较文件名和大小（box/ 中的文件只写入一次）
+    check_mtime = os.environ.get('CI') != 'true'
+    current = {}
+    to_hash = []
     for filename in os.listdir(directory):
-        if filename.endswith(".json"):
-            filepath = os.path.join(directory, filename)
-            try:
-                with open(filepath, 'rb') as f:
-                    content = f.read()
-                    hashes.add(hashlib.sha256(content).hexdigest())
-            except Exception as e:
-                logger.warning(f"Could not read or hash file {filepath}: {e}")
-    return hashes
-
-def save_valid_file(file_name: str, content: str):
-    """保存有效文件到磁盘，添加时间戳"""
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    base_name = os.path.splitext(file_name)[0]
-    new_file_name = f"{base_name}_{timestamp}.json"
-    save_path = os.path.join("box", new_file_name)
-    with open(save_path, "w", encoding="utf-8") as f:
-        f.write(content)
-    logger.info(f"Successfully saved {new_file_name} to 'box/'")
-
-def load_cache(cache_file: str = "search_cache.json") -> Dict[str, dict]:
-    """加载缓存的搜索结果，移除过期条目（30 天前）"""
+        if not filename.endswith(".json"):
+            continue
+        filepath = os.path.join(directory, filename)
+        try:
+            stat = os.stat(filepath)
+        except OSError as e:
+            logger.warning(f"Could not stat file {filepath}: {e}")
+            continue
+        entry = manifest.get(filename)
+        if entry and entry.get('canonical_hash') and entry.get('size') == stat.st_size and (not check_mtime or entry.get('mtime') == stat.st_mtime):
+            current[filename] = entry
+        else:
+            current[filename] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'canonical_hash': ''}
+            to_hash.append(filename)
+
+    paths = [os.path.join(directory, filename) for filename in to_hash]
+    if len(paths) >= HASH_PROCESS_THRESHOLD:
+        with ProcessPoolExecutor() as executor:
+            hashes = list(executor.map(hash_file, paths, chunksize=16))
+    else:
+        hashes = [hash_file(path) for path in paths]
+    for filename, content_hash in zip(to_hash, hashes):
+        current[filename]['canonical_hash'] = content_hash
+    logger.info(f"Box manifest: {len(current)} files, {len(to_hash)} hashed this run.")
+
+    save_box_manifest({filename: entry for filename, entry in current.items() if entry['canonical_hash']})
+    return {entry['canonical_hash'] for entry in current.values() if entry['canonical_hash']}
+
+def save_valid_file(file_name: str, data: dict, index: Dict[str, dict]):
+    """按规范化内容哈希保存有效配置到 box/，原始文件名记入名称索引"""
+    saved_name, is_new = save_config(data, file_name, index)
+    if is_new:
+        logger.info(f"Successfully saved {file_name} as {saved_name} to 'box/'")
+    else:
+        logger.info(f"{file_name} has the same content as existing {saved_name}, recorded in index only.")
+
+def load_cache(cache_file: str = SEARCH_CACHE_FILE) -> Dict[str, dict]:
+    """
+    加载缓存的搜索结果，移除过期条目（30 天前）。
+    键为 “仓库/路径”，值包含 blob sha、结论（valid/invalid/duplicate）以及 repo、path、file_name、last_modified
+    """
     if os.path.exists(cache_file):
         try:
             with open(cache_file, 'r', encoding='utf-8') as f:
@@ -104,9 +248,10 @@ def load_cache(cache_file: str = "search_cache.json") -> Dict[str, dict]:
             logger.warning(f"Error loading cache: {e}")
     return {}
 
-def save_cache(cache: Dict[str, dict], cache_file: str = "search_cache.json"):
+def save_cache(cache: Dict[str, dict], cache_file: str = SEARCH_CACHE_FILE):
     """保存搜索结果到缓存，优化存储格式"""
     try:
+        os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
         with open(cache_file, 'w', encoding='utf-8') as f:
             json.dump(cache, f, ensure_ascii=False, indent=0)
     except Exception as e:
@@ -118,6 +263,9 @@ def generate_dynamic_queries(cache: Dict[str, dict]) -> List[str]:
     paths = {}
     repos = {}
     for data in cache.values():
+        # 只统计有效配置所在的文件名、路径和仓库
+        if data.get('verdict', 'valid') != 'valid':
+            continue
         file_name = data.get('file_name', '').split('_')[0] + '.json'
         path = data.get('path', '')
         repo = data.get('repo', '')
@@ -142,8 +290,10 @@ def generate_dynamic_queries(cache: Dict[str, dict]) -> List[str]:
     )
     return dynamic_queries[:5]
 
-def load_query_stats(stats_file: str = "query_stats.json") -> Dict[str, dict]:
-    """加载查询统计"""
+def load_query_stats(stats_file: str = QUERY_STATS_FILE) -> Dict[str, dict]:
+    """加载查询统计，新位置没有时读取仓库根目录的旧文件"""
+    if not os.path.exists(stats_file) and os.path.exists(LEGACY_QUERY_STATS_FILE):
+        stats_file = LEGACY_QUERY_STATS_FILE
     if os.path.exists(stats_file):
         try:
             with open(stats_file, 'r', encoding='utf-8') as f:
@@ -152,120 +302,326 @@ def load_query_stats(stats_file: str = "query_stats.json") -> Dict[str, dict]:
             logger.warning(f"Error loading query stats: {e}")
     return {}
 
-def save_query_stats(stats: Dict[str, dict], stats_file: str = "query_stats.json"):
+def save_query_stats(stats: Dict[str, dict], stats_file: str = QUERY_STATS_FILE):
     """保存查询统计"""
     try:
+        os.makedirs(os.path.dirname(stats_file) or '.', exist_ok=True)
         with open(stats_file, 'w', encoding='utf-8') as f:
             json.dump(stats, f, ensure_ascii=False, indent=2)
     except Exception as e:
         logger.error(f"Error saving query stats: {e}")
 
-def search_github(query: str, github_token: str, page: int = 1) -> Tuple[List[dict], int]:
-    """执行 GitHub 搜索请求，带重试机制，并对 403 错误进行处理"""
+class PageScheduler:
+    """
+    按查询做多臂老虎机（UCB1）分配搜索 API 调用：每个查询是一个臂，下一次拉动的是它的下一页。
+    收益是该页新保存的有效配置数，各页的拉动次数和收益记录在 stats[query]['pages'] 中，
+    该页没有记录时用查询整体的平均收益。从未搜索过的查询优先；历史统计每次运行衰减，
+    久未搜索的查询的探索奖励逐渐变大，会被重新尝试。
+    """
+
+    def __init__(self, queries: List[str], stats: Dict[str, dict], budget: int = SEARCH_PAGE_BUDGET, max_pages: int = SEARCH_MAX_PAGES):
+        self.queries = queries
+        self.stats = stats
+        self.budget = budget
+        self.max_pages = max_pages
+        self.used = 0
+        self.next_page = {query: 1 for query in queries}
+        self.in_flight: Set[str] = set()
+        self.finished: Set[str] = set()
+        # 每有一页搜索结果返回就置位，唤醒因所有查询都在搜索中而等待的 worker
+        self._page_done = asyncio.Event()
+        for query in queries:
+            entry = stats.setdefault(query, {})
+            entry.setdefault('valid', 0)
+            entry.setdefault('total', 0)
+            for page_stats in entry.setdefault('pages', {}).values():
+                page_stats['pulls'] *= STATS_DECAY
+                page_stats['reward'] *= STATS_DECAY
+
+    def _totals(self, query: str) -> Tuple[float, float]:
+        pages = self.stats[query]['pages'].values()
+        return sum(p['pulls'] for p in pages), sum(p['reward'] for p in pages)
+
+    def _score(self, query: str, total_pulls: float, scale: float) -> float:
+        page_stats = self.stats[query]['pages'].get(str(self.next_page[query]))
+        if page_stats and page_stats['pulls'] >= 0.5:
+            pulls, reward = page_stats['pulls'], page_stats['reward']
+        else:
+            pulls, reward = self._totals(query)
+        if pulls < 0.5:
+            return math.inf
+        bonus = UCB_EXPLORATION * scale * math.sqrt(math.log(max(total_pulls, 1)) / pulls)
+        return reward / pulls + bonus
+
+    def next(self):
+        """选出下一次搜索的 (查询, 页码)，预算用完或没有可选的查询时返回 None"""
+        if self.used >= self.budget:
+            return None
+        candidates = [q for q in self.queries if q not in self.in_flight and q not in self.finished]
+        if not candidates:
+            return None
+        totals = {query: self._totals(query) for query in self.queries}
+        total_pulls = sum(pulls for pulls, _ in totals.values())
+        # 探索奖励按收益的量级缩放，收益是每页的配置数而不是 0/1
+        scale = max([reward / pulls for pulls, reward in totals.values() if pulls >= 0.5] + [1.0])
+        query = max(candidates, key=lambda q: self._score(q, total_pulls, scale))
+        self.in_flight.add(query)
+        self.used += 1
+        return query, self.next_page[query]
+
+    async def wait_next(self):
+        """
+        同 next()，但剩余未结束的查询都在搜索中时等待其中一页返回后再选，
+        只有预算用完或所有查询都已结束时才返回 None
+        """
+        while True:
+            arm = self.next()
+            if arm is not None or self.used >= self.budget or not self.in_flight:
+                return arm
+            self._page_done.clear()
+            await self._page_done.wait()
+
+    def page_searched(self, query: str, page: int, found: int, total_count: int):
+        """一页搜索结果返回后调用，没有更多结果时该查询本次运行不再翻页"""
+        self.in_flight.discard(query)
+        self._page_done.set()
+        self.stats[query]['total'] += found
+        if not found or page * 100 >= total_count or page >= self.max_pages:
+            self.finished.add(query)
+        else:
+            self.next_page[query] = page + 1
+
+    def record(self, query: str, page: int, valid_files: int):
+        """该页的下载和验证完成后记录收益"""
+        entry = self.stats[query]
+        page_stats = entry['pages'].setdefault(str(page), {'pulls': 0.0, 'reward': 0.0})
+        page_stats['pulls'] += 1
+        page_stats['reward'] += valid_files
+        entry['valid'] += valid_files
+        entry['last_searched'] = datetime.now().isoformat(timespec='seconds')
+
+class SearchRateLimiter:
+    """
+    GitHub 搜索 API 的令牌桶。令牌数和补满时间来自每个响应的 X-RateLimit-Remaining / X-RateLimit-Reset，
+    遇到 429/403 时按 Retry-After（或到重置时间为止）暂停所有请求；只在令牌用完时等待，且只等到限额恢复。
+    """
+
+    def __init__(self, capacity: int = SEARCH_RATE_LIMIT, window: float = SEARCH_RATE_WINDOW):
+        self.capacity = capacity
+        self.window = window
+        self.tokens = capacity
+        self.reset_at = time.time() + window
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """取一个令牌，令牌用完或被暂停时等待"""
+        async with self._lock:
+            while True:
+                now = time.time()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                if now >= self.reset_at:
+                    self.tokens = self.capacity
+                    self.reset_at = now + self.window
+                if self.tokens > 0:
+                    self.tokens -= 1
+                    return
+                logger.info(f"Search rate limit budget used up, waiting {self.reset_at - now:.0f} seconds for reset.")
+                await asyncio.sleep(self.reset_at - now)
+
+    def update(self, headers):
+        """按响应头校正剩余令牌和重置时间"""
+        try:
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset_at = float(headers['X-RateLimit-Reset'])
+        except (KeyError, ValueError):
+            return
+        if reset_at > self.reset_at + 1:
+            # 已进入新的限额窗口
+            self.tokens = remaining
+        else:
+            self.tokens = min(self.tokens, remaining)
+        self.reset_at = reset_at
+
+    def block(self, headers, attempt: int) -> float:
+        """被限流（429/403）时暂停所有请求，返回暂停秒数"""
+        retry_after = headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            wait = int(retry_after)
+        elif headers.get('X-RateLimit-Remaining') == '0':
+            wait = max(self.reset_at - time.time(), 1)
+        else:
+            # 没有任何提示的次级限流，GitHub 建议至少等待一分钟
+            wait = 60 * (attempt + 1)
+        self.blocked_until = max(self.blocked_until, time.time() + wait)
+        return wait
+
+async def search_github(session: aiohttp.ClientSession, limiter: SearchRateLimiter, query: str, page: int = 1) -> Tuple[List[dict], int]:
+    """执行 GitHub 搜索请求，请求前从令牌桶取令牌，被限流时按响应头等待后重试"""
     search_url = "https://api.github.com/search/code"
-    headers = {
-        "Authorization": f"token {github_token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    params = {"q": query, "per_page": 100, "page": page, "sort": "updated", "order": "desc"}
     retries = 3
     for attempt in range(retries):
+        await limiter.acquire()
         try:
-            response = requests.get(
-                search_url,
-                params={"q": query, "per_page": 100, "page": page, "sort": "updated", "order": "desc"},
-                headers=headers
-            )
-            # 明确处理 429 和 403 错误
-            if response.status_code == 429:
-                retry_after = int(response.headers.get("Retry-After", 60))
-                logger.warning(f"Rate limit exceeded for query '{query}', page {page}. Waiting {retry_after} seconds...")
-                time.sleep(retry_after)
-                continue
-            if response.status_code == 403:
-                # 当遇到 403 错误时，可能是权限或临时限制。等待更长时间再重试。
-                wait_time = 60 * (attempt + 1)
-                logger.warning(f"Error 403 for query '{query}', page {page} (attempt {attempt + 1}/{retries}). Waiting for {wait_time} seconds before retrying...")
-                time.sleep(wait_time)
-                continue
-            
-            response.raise_for_status()
-            search_results = response.json()
-            return search_results.get('items', []), search_results.get('total_count', 0)
-        except requests.exceptions.RequestException as e:
+            async with session.get(search_url, params=params) as response:
+                limiter.update(response.headers)
+                if response.status in (403, 429):
+                    wait = limiter.block(response.headers, attempt)
+                    logger.warning(f"Rate limited ({response.status}) for query '{query}', page {page} (attempt {attempt + 1}/{retries}). Pausing searches for {wait:.0f} seconds...")
+                    continue
+                response.raise_for_status()
+                try:
+                    search_results = await response.json()
+                except (aiohttp.ContentTypeError, ValueError) as e:
+                    # 响应体不是 JSON：按空页处理，调度器记为一次没有产出的搜索
+                    logger.warning(f"Invalid search response for query '{query}', page {page}: {e}")
+                    return [], 0
+                if not isinstance(search_results, dict):
+                    logger.warning(f"Unexpected search response for query '{query}', page {page}.")
+                    return [], 0
+                return search_results.get('items', []), search_results.get('total_count', 0)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.warning(f"Error searching query '{query}', page {page} (attempt {attempt + 1}/{retries}): {e}")
             if attempt < retries - 1:
-                time.sleep(2 ** attempt)
-            else:
-                logger.error(f"Failed to search query '{query}', page {page} after {retries} attempts.")
-                return [], 0
+                await asyncio.sleep(2 ** attempt)
+    logger.error(f"Failed to search query '{query}', page {page} after {retries} attempts.")
     return [], 0
 
-async def process_query(query: str, github_token: str, processed_urls: Set[str], cache: Dict[str, dict], stats: Dict[str, dict], content_hashes: Set[str], max_pages: int = 10):
-    """处理单个查询，搜索并保存 TVBox 配置文件"""
-    page = 1
-    valid_files = stats.get(query, {}).get('valid', 0)
-    total_files = stats.get(query, {}).get('total', 0)
-    downloaded_content_hashes: Set[str] = set()
+def cache_key(item: dict) -> str:
+    """搜索缓存的键：仓库/路径"""
+    return f"{item.get('repository', {}).get('full_name', '')}/{item.get('path', '')}"
 
-    while page <= max_pages:
-        items, total_count = search_github(query, github_token, page)
-        total_files += len(items)
-        logger.info(f"Query '{query}', page {page}: Found {len(items)} files, total: {total_count}")
-        
-        if not items:
-            logger.info(f"No more results for query '{query}'. Exiting pagination.")
-            break
-        
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=100)) as session:
-            tasks = []
-            urls_to_process = []
-            for item in items:
-                raw_url = item["html_url"].replace("github.com", "raw.githubusercontent.com").replace("/blob/", "/")
-                
-                if raw_url in processed_urls:
-                    logger.debug(f"Skipping duplicate URL: {raw_url}")
-                    continue
-                processed_urls.add(raw_url)
-                
-                tasks.append(fetch_url(session, raw_url, headers={"Accept": "application/vnd.github.v3+json"}))
-                urls_to_process.append(raw_url)
+def record_verdict(cache: Dict[str, dict], item: dict, verdict: str):
+    """记录一个搜索结果文件的结论（valid/invalid/duplicate），保留 generate_dynamic_queries 使用的字段"""
+    cache[cache_key(item)] = {
+        'sha': item.get('sha', ''),
+        'verdict': verdict,
+        'repo': item.get('repository', {}).get('full_name', ''),
+        'path': item.get('path', ''),
+        'file_name': os.path.splitext(item.get('name', ''))[0],
+        'last_modified': datetime.now().isoformat(timespec='seconds'),
+    }
 
-            downloaded_contents = await asyncio.gather(*tasks, return_exceptions=True)
+def evaluate_content(content: str, url: str, content_hashes: Set[str], downloaded_content_hashes: Set[str], index: Dict[str, dict]) -> str:
+    """解析并验证下载的内容，有效的新配置保存到 box/，返回结论（valid/invalid/duplicate）"""
+    # 先解析再按规范化内容去重，格式或键顺序不同的相同配置只保存一次
+    data = parse_config(content)
+    if data is None:
+        logger.warning(f"Validation failed for {url}. Skipping.")
+        return 'invalid'
+    content_hash = canonical_hash(data)
 
-            for i, content in enumerate(downloaded_contents):
-                if isinstance(content, Exception) or content is None:
-                    logger.warning(f"Skipping {urls_to_process[i]} due to fetch error.")
-                    continue
-                
-                content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
-                
-                if content_hash in content_hashes:
-                    logger.info(f"Skipping {urls_to_process[i]}: content already exists locally.")
-                    continue
-                
-                if content_hash in downloaded_content_hashes:
-                    logger.info(f"Skipping {urls_to_process[i]}: content is a duplicate within this run.")
-                    continue
-                
-                if validate_tvbox_interface(content):
-                    logger.info(f"Validation successful for {urls_to_process[i]}. Saving...")
-                    file_name = urls_to_process[i].split("/")[-1]
-                    save_valid_file(file_name, content)
-                    content_hashes.add(content_hash)
-                    downloaded_content_hashes.add(content_hash)
-                    valid_files += 1
-                else:
-                    logger.warning(f"Validation failed for {urls_to_process[i]}. Skipping.")
+    if content_hash in content_hashes:
+        logger.info(f"Skipping {url}: content already exists locally.")
+        return 'duplicate'
+
+    if content_hash in downloaded_content_hashes:
+        logger.info(f"Skipping {url}: content is a duplicate within this run.")
+        return 'duplicate'
+
+    if not is_tvbox_config(data):
+        logger.warning(f"Validation failed for {url}. Skipping.")
+        return 'invalid'
+
+    logger.info(f"Validation successful for {url}. Saving...")
+    save_valid_file(url.split("/")[-1], data, index)
+    content_hashes.add(content_hash)
+    downloaded_content_hashes.add(content_hash)
+    return 'valid'
+
+async def process_items(items: List[dict], raw_session: aiohttp.ClientSession, processed_urls: Set[str], cache: Dict[str, dict], seen_shas: Set[str], content_hashes: Set[str], downloaded_content_hashes: Set[str], raw_verdicts: Dict[str, str], index: Dict[str, dict]) -> int:
+    """下载一页搜索结果中的原始文件，验证并保存 TVBox 配置，返回保存的文件数；blob sha 已评估过的文件不再下载"""
+    tasks = []
+    items_to_process = []
+    urls_to_process = []
+    for item in items:
+        raw_url = item["html_url"].replace("github.com", "raw.githubusercontent.com").replace("/blob/", "/")
         
-        save_cache(cache)
+        if raw_url in processed_urls:
+            logger.debug(f"Skipping duplicate URL: {raw_url}")
+            continue
+        processed_urls.add(raw_url)
+
+        # 相同 blob sha 的文件内容相同，之前已有结论（不论在哪个仓库/路径）就跳过
+        sha = item.get('sha')
+        if sha and sha in seen_shas:
+            logger.debug(f"Skipping {raw_url}: blob {sha} already evaluated.")
+            entry = cache.get(cache_key(item))
+            if entry and entry.get('sha') == sha:
+                entry['last_modified'] = datetime.now().isoformat(timespec='seconds')
+            continue
+        if sha:
+            seen_shas.add(sha)
         
-        page += 1
-        if page * 100 >= total_count:
-            logger.info(f"Reached end of results for query '{query}'.")
+        tasks.append(fetch_config(raw_session, raw_url, headers={"Accept": "application/vnd.github.v3+json"}))
+        items_to_process.append(item)
+        urls_to_process.append(raw_url)
+
+    downloaded_contents = await asyncio.gather(*tasks, return_exceptions=True)
+
+    valid_files = 0
+    for i, raw_file in enumerate(downloaded_contents):
+        item = items_to_process[i]
+        if isinstance(raw_file, Exception) or raw_file is None:
+            # 下载失败不记录结论，下次运行重试
+            logger.warning(f"Skipping {urls_to_process[i]} due to fetch error.")
+            seen_shas.discard(item.get('sha'))
+            continue
+
+        if raw_file.rejected:
+            logger.info(f"Skipping {urls_to_process[i]}: {raw_file.rejected}.")
+            record_verdict(cache, item, 'invalid')
+            continue
+
+        # 字节完全相同的文件本次运行已评估过，沿用结论，不再解析
+        if raw_file.raw_hash in raw_verdicts:
+            logger.info(f"Skipping {urls_to_process[i]}: identical file already evaluated in this run.")
+            record_verdict(cache, item, raw_verdicts[raw_file.raw_hash])
+            continue
+
+        verdict = evaluate_content(raw_file.content, urls_to_process[i], content_hashes, downloaded_content_hashes, index)
+        record_verdict(cache, item, verdict)
+        raw_verdicts[raw_file.raw_hash] = 'duplicate' if verdict == 'valid' else verdict
+        if verdict == 'valid':
+            valid_files += 1
+    return valid_files
+
+async def search_worker(scheduler: PageScheduler, api_session: aiohttp.ClientSession, raw_session: aiohttp.ClientSession, limiter: SearchRateLimiter, processed_urls: Set[str], cache: Dict[str, dict], seen_shas: Set[str], content_hashes: Set[str], downloaded_content_hashes: Set[str], raw_verdicts: Dict[str, str], index: Dict[str, dict]):
+    """按调度器的选择逐页搜索；每页结果到达后立即在后台下载，同时请求下一页"""
+    page_tasks = []
+
+    async def process_page(query: str, page: int, items: List[dict]):
+        try:
+            valid_files = await process_items(items, raw_session, processed_urls, cache, seen_shas, content_hashes, downloaded_content_hashes, raw_verdicts, index)
+        except Exception as e:
+            # 一页出错不影响其他查询，本页记为没有产出
+            logger.error(f"Error processing query '{query}', page {page}: {e}")
+            valid_files = 0
+        scheduler.record(query, page, valid_files)
+        logger.info(f"Query '{query}', page {page}: saved {valid_files} new configs.")
+
+    while True:
+        arm = await scheduler.wait_next()
+        if arm is None:
             break
-    
-    stats[query] = {'valid': valid_files, 'total': total_files}
-    save_query_stats(stats)
+        query, page = arm
+        try:
+            items, total_count = await search_github(api_session, limiter, query, page)
+        except Exception as e:
+            # 必须调用 page_searched 让出该查询，否则等待中的 worker 不会被唤醒
+            logger.error(f"Error searching query '{query}', page {page}: {e}")
+            items, total_count = [], 0
+        logger.info(f"Query '{query}', page {page}: Found {len(items)} files, total: {total_count}")
+        scheduler.page_searched(query, page, len(items), total_count)
+        if items:
+            page_tasks.append(asyncio.create_task(process_page(query, page, items)))
+        else:
+            scheduler.record(query, page, 0)
+
+    await asyncio.gather(*page_tasks)
 
 async def search_and_save_tvbox_interfaces():
     """搜索、验证并保存 TVBox 接口文件"""
@@ -290,37 +646,44 @@ async def search_and_save_tvbox_interfaces():
     os.makedirs("box", exist_ok=True)
     
     cache = load_cache()
+    # 缓存中所有已评估过的 blob sha，本次运行新评估的也会加入
+    seen_shas: Set[str] = {entry['sha'] for entry in cache.values() if entry.get('sha')}
     stats = load_query_stats()
     processed_urls: Set[str] = set()
     content_hashes: Set[str] = load_existing_content_hashes("box")
+    index = load_index()
     
     dynamic_queries = generate_dynamic_queries(cache)
     queries.extend(dynamic_queries)
     logger.info(f"Added {len(dynamic_queries)} dynamic queries: {dynamic_queries}")
     
-    def query_priority(query):
-        stats_data = stats.get(query, {'valid': 0, 'total': 1})
-        hit_rate = stats_data['valid'] / max(stats_data['total'], 1)
-        return hit_rate
-    queries.sort(key=query_priority, reverse=True)
-    logger.info(f"Sorted queries by hit rate: {queries}")
-    
-    # 增加每次查询后的延时，以减少 API 压力
-    delay_between_queries = 20 # 秒
-    
-    max_workers = min(len(queries), multiprocessing.cpu_count())
-    max_pages_per_query = 5 if len(queries) > max_workers else 10
-    logger.info(f"Using {max_workers} parallel threads for {len(queries)} queries, max {max_pages_per_query} pages per query.")
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for query in queries:
-            future = executor.submit(asyncio.run, process_query(query, github_token, processed_urls, cache, stats, content_hashes, max_pages_per_query))
-            future.result()
-            # 每次处理完一个查询，都暂停一下
-            logger.info(f"Finished processing query '{query}'. Waiting for {delay_between_queries} seconds.")
-            time.sleep(delay_between_queries)
-    
-    save_query_stats(stats)
+    scheduler = PageScheduler(queries, stats)
+    logger.info(f"Running {len(queries)} queries with a budget of {scheduler.budget} search pages.")
+
+    # 调度器按近期产出分配翻页预算，实际的请求速率由令牌桶控制
+    headers = {
+        "Authorization": f"token {github_token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+    limiter = SearchRateLimiter()
+    # 原始文件的下载在整个运行期间共用一个会话：连接保持复用，同一主机的连接数有上限
+    raw_connector = aiohttp.TCPConnector(limit=RAW_FETCH_CONCURRENCY, limit_per_host=RAW_FETCH_PER_HOST)
+    async with aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=60)) as api_session, \
+            aiohttp.ClientSession(connector=raw_connector) as raw_session:
+        downloaded_content_hashes: Set[str] = set()
+        # 原始字节的 sha256 → 结论，字节相同的文件只解析一次
+        raw_verdicts: Dict[str, str] = {}
+        try:
+            await asyncio.gather(*[
+                search_worker(scheduler, api_session, raw_session, limiter, processed_urls, cache, seen_shas, content_hashes, downloaded_content_hashes, raw_verdicts, index)
+                for _ in range(SEARCH_WORKERS)
+            ])
+        finally:
+            # 出错中断时也保存已有的查询统计、搜索缓存和名称索引
+            logger.info(f"Used {scheduler.used} of {scheduler.budget} search pages.")
+            save_query_stats(stats)
+            save_cache(cache)
+            save_index(index)
 
 if __name__ == "__main__":
     asyncio.run(search_and_save_tvbox_interfaces())